@@ -1,9 +1,16 @@
 from __future__ import annotations
 
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
 import numpy as np
 
-from backend.config import CATEGORIES
-from backend.embeddings import get_model
+from backend import metrics
+from backend.config import FRAMEWORKS, PROTOTYPE_CACHE_DIR, QUESTION_BANK, get_categories
+from backend.embeddings import encode, encode_many, get_model, model_id
 
 PROTOTYPES = {
     "Customer Obsession": [
@@ -104,59 +111,157 @@ PROTOTYPES = {
     ],
 }
 
-_centroids: dict[str, np.ndarray] | None = None
+# Prototype matrices keyed by the ordered tuple of principles they score against
+_matrices: dict[tuple[str, ...], np.ndarray] = {}
+_matrices_lock = threading.Lock()
+# (allowed categories, question bank prompt) -> category; see warm_question_bank
+_bank_categories: dict[tuple[tuple[str, ...], str], str] = {}
+
+
+def _prototype_sentences(principle: str) -> list[str]:
+    # Principles without curated prototypes use their own name as the prototype
+    return PROTOTYPES.get(principle, [principle])
+
+
+def _matrix_path(principles: tuple[str, ...]) -> Path:
+    spec = [[principle, _prototype_sentences(principle)] for principle in principles]
+    digest = hashlib.sha256(json.dumps(spec).encode("utf-8")).hexdigest()[:16]
+    return Path(PROTOTYPE_CACHE_DIR) / f"{model_id()}-{digest}.npy"
+
+
+def build_matrix(principles: tuple[str, ...], model=None) -> np.ndarray:
+    """Prototype centroids of principles, encoded with model (default: the serving one)."""
+    sentences: list[str] = []
+    spans: list[tuple[int, int]] = []
+    for principle in principles:
+        prototypes = _prototype_sentences(principle)
+        spans.append((len(sentences), len(sentences) + len(prototypes)))
+        sentences.extend(prototypes)
+
+    vectors = (model or get_model()).encode(sentences)
+    matrix = np.vstack([vectors[start:end].mean(axis=0) for start, end in spans])
+    matrix = matrix.astype(np.float32)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix
+
+
+def get_prototype_matrix(principles: list[str]) -> np.ndarray:
+    """
+    Return the L2-normalized (len(principles), dim) prototype matrix.
+
+    Each row is the centroid of that principle's prototype sentences. Matrices
+    are built once per principle list, persisted as .npy under
+    PROTOTYPE_CACHE_DIR and reused from memory afterwards.
+    """
+    key = tuple(principles)
+    matrix = _matrices.get(key)
+    if matrix is not None:
+        return matrix
+
+    with _matrices_lock:
+        matrix = _matrices.get(key)
+        if matrix is not None:
+            return matrix
 
+        path = _matrix_path(key)
+        if path.exists():
+            matrix = np.load(path)
+        if matrix is None or matrix.shape[0] != len(key):
+            matrix = build_matrix(key)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "wb") as f:
+                np.save(f, matrix)
+            os.replace(tmp_path, path)
+        _matrices[key] = matrix
+    return matrix
 
-def _compute_centroids() -> dict[str, np.ndarray]:
-    global _centroids
-    if _centroids is not None:
-        return _centroids
 
-    model = get_model()
-    _centroids = {}
-    for category, sentences in PROTOTYPES.items():
-        embeddings = model.encode(sentences)
-        _centroids[category] = np.mean(embeddings, axis=0)
-    return _centroids
+def warm_question_bank() -> int:
+    """
+    Precompute the embedding and category of every QUESTION_BANK prompt.
+
+    Vectors land in the embedding cache and categories in _bank_categories,
+    so submitting a bank prompt never runs the model. Returns the number of
+    prompts covered.
+    """
+    covered = 0
+    for framework_id, prompts in QUESTION_BANK.items():
+        if not prompts:
+            continue
+        allowed = tuple(get_categories(framework_id))
+        categories = categorize_many(encode_many(prompts), list(allowed))
+        _bank_categories.update({
+            (allowed, prompt): category
+            for prompt, category in zip(prompts, categories)
+        })
+        covered += len(prompts)
+    return covered
+
+
+def warm_prototypes() -> None:
+    """Load (or build) the prototype matrix of every configured framework."""
+    get_prototype_matrix(list(PROTOTYPES.keys()))
+    for framework in FRAMEWORKS.values():
+        get_prototype_matrix(framework["principles"])
+
+
+def classify(
+    text: str,
+    allowed_categories: list[str] | None = None,
+    embedding: np.ndarray | None = None,
+    k: int = 3,
+) -> dict:
+    """
+    Score text against every candidate principle with one matrix-vector product.
+
+    Returns {"category", "confidence", "top"}, where top holds the k best
+    (principle, cosine similarity) pairs and confidence is the similarity
+    margin between the best and second-best principle.
+    """
+    targets = allowed_categories or list(PROTOTYPES.keys())
+    matrix = get_prototype_matrix(targets)
+    if embedding is None:
+        embedding = encode(text)
+
+    vector = np.asarray(embedding, dtype=np.float32)
+    vector = vector / np.linalg.norm(vector)
+    scores = matrix @ vector
 
+    order = np.argsort(-scores)[:k]
+    top = [(targets[i], float(scores[i])) for i in order]
+    confidence = top[0][1] - top[1][1] if len(top) > 1 else 1.0
+    return {"category": top[0][0], "confidence": confidence, "top": top}
 
-def categorize(text: str, allowed_categories: list[str] | None = None) -> str:
+
+@metrics.timed("categorize")
+def categorize(
+    text: str,
+    allowed_categories: list[str] | None = None,
+    embedding: np.ndarray | None = None,
+) -> str:
     """
     Categorize text into the best matching principle.
 
     If allowed_categories is provided, only match against those principles.
     For principles not in PROTOTYPES (e.g. from non-Amazon frameworks), we
-    use the principle name itself as a semantic prototype.
+    use the principle name itself as a semantic prototype. Pass a precomputed
+    embedding of text to skip encoding it again. Question bank prompts are
+    answered from the table built by warm_question_bank.
     """
-    model = get_model()
-    embedding = model.encode(text)
-
-    # Determine which categories to compare against
-    if allowed_categories:
-        targets = allowed_categories
-    else:
-        centroids = _compute_centroids()
-        targets = list(centroids.keys())
-
-    best_category = targets[0]
-    best_similarity = -1.0
-
-    # Pre-compute centroids for known categories
-    centroids = _compute_centroids()
-
-    for category in targets:
-        if category in centroids:
-            centroid = centroids[category]
-        else:
-            # Dynamic prototype: encode the principle name itself
-            centroid = model.encode(category)
-
-        similarity = float(
-            np.dot(embedding, centroid)
-            / (np.linalg.norm(embedding) * np.linalg.norm(centroid))
-        )
-        if similarity > best_similarity:
-            best_similarity = similarity
-            best_category = category
-
-    return best_category
+    known = _bank_categories.get((tuple(allowed_categories or PROTOTYPES), text))
+    if known is not None:
+        return known
+    return classify(text, allowed_categories, embedding=embedding, k=1)["category"]
+
+
+@metrics.timed("categorize")
+def categorize_many(
+    vectors: np.ndarray, allowed_categories: list[str] | None = None
+) -> list[str]:
+    """Categorize a batch of precomputed embeddings with one matrix product."""
+    targets = allowed_categories or list(PROTOTYPES.keys())
+    matrix = get_prototype_matrix(targets)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    best = np.argmax(vectors @ matrix.T, axis=1)
+    return [targets[i] for i in best]
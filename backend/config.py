@@ -3,9 +3,138 @@ from pathlib import Path
 
 ANTHROPIC_API_KEY = os.environ.get("ANTHROPIC_API_KEY", "")
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
+# Provider endpoints; override to point at a proxy or the benchmark stub server
+GEMINI_API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+ANTHROPIC_BASE_URL = os.environ.get("ANTHROPIC_BASE_URL") or None
 
-DATABASE_PATH = "backend/data/consistency.db"
-CHROMA_PATH = "backend/data/chroma"
+# Everything the backend persists lives under this directory
+DATA_DIR = os.environ.get("DATA_DIR", "backend/data")
+
+# LLM consistency checks
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", "8"))
+LLM_REQUEST_TIMEOUT = float(os.environ.get("LLM_REQUEST_TIMEOUT", "30"))
+LLM_BATCH_SIZE = int(os.environ.get("LLM_BATCH_SIZE", "10"))
+CONSISTENCY_DEADLINE_SECONDS = float(os.environ.get("CONSISTENCY_DEADLINE_SECONDS", "45"))
+
+# Provider routing (see llm_router.py). Providers with an API key are tried in
+# LLM_PROVIDER_ORDER. LLM_REQUEST_TIMEOUT bounds every call. A call still
+# running after its provider's p95 latency (at least LLM_HEDGE_MIN_SECONDS;
+# LLM_HEDGE_DEFAULT_SECONDS until enough calls are seen) is hedged on the
+# next provider. LLM_BREAKER_FAILURES consecutive failures open a provider's
+# circuit for LLM_BREAKER_COOLDOWN_SECONDS.
+LLM_PROVIDER_ORDER = os.environ.get("LLM_PROVIDER_ORDER", "gemini,anthropic").split(",")
+LLM_HEDGE_ENABLED = os.environ.get("LLM_HEDGE_ENABLED", "1") == "1"
+LLM_HEDGE_MIN_SECONDS = float(os.environ.get("LLM_HEDGE_MIN_SECONDS", "1.0"))
+LLM_HEDGE_DEFAULT_SECONDS = float(os.environ.get("LLM_HEDGE_DEFAULT_SECONDS", "8.0"))
+LLM_LATENCY_WINDOW = int(os.environ.get("LLM_LATENCY_WINDOW", "200"))
+LLM_BREAKER_FAILURES = int(os.environ.get("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.environ.get("LLM_BREAKER_COOLDOWN_SECONDS", "30"))
+
+# Provider rate limits (see llm_scheduler.py), in requests and tokens per
+# minute and shared by every worker process on this database; 0 disables a
+# limit. Up to LLM_RATE_BURST_FRACTION of a minute's quota may go out at once,
+# and background checks leave LLM_INTERACTIVE_RESERVE of it for interactive ones.
+LLM_SCHEDULER_ENABLED = os.environ.get("LLM_SCHEDULER_ENABLED", "1") == "1"
+LLM_RATE_LIMITS = {
+    "gemini": (
+        int(os.environ.get("GEMINI_RPM", "1000")),
+        int(os.environ.get("GEMINI_TPM", "1000000")),
+    ),
+    "anthropic": (
+        int(os.environ.get("ANTHROPIC_RPM", "50")),
+        int(os.environ.get("ANTHROPIC_TPM", "30000")),
+    ),
+}
+LLM_RATE_BURST_FRACTION = float(os.environ.get("LLM_RATE_BURST_FRACTION", "0.1"))
+LLM_INTERACTIVE_RESERVE = float(os.environ.get("LLM_INTERACTIVE_RESERVE", "0.2"))
+
+# Neighbors farther than this cosine distance are never sent for a consistency check
+SIMILARITY_MAX_DISTANCE = float(os.environ.get("SIMILARITY_MAX_DISTANCE", "0.75"))
+
+# Most neighbors checked per statement, and the largest accepted bulk upload
+MAX_NEIGHBORS = int(os.environ.get("MAX_NEIGHBORS", "10"))
+QUESTION_BATCH_MAX_ITEMS = int(os.environ.get("QUESTION_BATCH_MAX_ITEMS", "100"))
+
+# Background consistency job queue
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", "4"))
+JOB_RETRY_BASE_SECONDS = float(os.environ.get("JOB_RETRY_BASE_SECONDS", "2"))
+JOB_LEASE_SECONDS = float(os.environ.get("JOB_LEASE_SECONDS", "120"))
+JOB_POLL_INTERVAL = float(os.environ.get("JOB_POLL_INTERVAL", "1.0"))
+JOB_RETENTION_SECONDS = int(os.environ.get("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+
+# Local pre-filter that settles obvious pairs before any LLM call. Set
+# PREFILTER_NLI_MODEL (e.g. cross-encoder/nli-deberta-v3-xsmall) to add a
+# CPU NLI tier between the Likert/embedding rule and the LLM.
+PREFILTER_ENABLED = os.environ.get("PREFILTER_ENABLED", "1") == "1"
+PREFILTER_PARAPHRASE_SIMILARITY = float(os.environ.get("PREFILTER_PARAPHRASE_SIMILARITY", "0.9"))
+PREFILTER_NLI_MODEL = os.environ.get("PREFILTER_NLI_MODEL", "")
+PREFILTER_NLI_THRESHOLD = float(os.environ.get("PREFILTER_NLI_THRESHOLD", "0.9"))
+# A statement answered the same way as an earlier near-duplicate (cosine
+# similarity of at least PREFILTER_INFERENCE_SIMILARITY) inherits that
+# duplicate's judged verdicts instead of asking the LLM again
+PREFILTER_INFERENCE_ENABLED = os.environ.get("PREFILTER_INFERENCE_ENABLED", "1") == "1"
+PREFILTER_INFERENCE_SIMILARITY = float(os.environ.get("PREFILTER_INFERENCE_SIMILARITY", "0.9"))
+
+# Graph deltas (GET /api/graph?since=N) are served from this many most recent
+# changes per session; older clients get the full graph instead
+GRAPH_CHANGELOG_MAX_VERSIONS = int(os.environ.get("GRAPH_CHANGELOG_MAX_VERSIONS", "5000"))
+
+# Pair-verdict cache (stored in the main SQLite database)
+VERDICT_CACHE_ENABLED = os.environ.get("VERDICT_CACHE_ENABLED", "1") == "1"
+VERDICT_CACHE_TTL_SECONDS = int(os.environ.get("VERDICT_CACHE_TTL_SECONDS", str(30 * 24 * 3600)))
+VERDICT_CACHE_MAX_ENTRIES = int(os.environ.get("VERDICT_CACHE_MAX_ENTRIES", "100000"))
+
+# Embedding cache keyed by (model, text): an in-memory LRU in front of a table
+# in the main SQLite database
+EMBEDDING_CACHE_ENABLED = os.environ.get("EMBEDDING_CACHE_ENABLED", "1") == "1"
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MEMORY_ENTRIES", "4096"))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.environ.get("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+
+# Offline verdicts for question-bank pairs (build with python -m backend.verdict_table)
+VERDICT_TABLE_ENABLED = os.environ.get("VERDICT_TABLE_ENABLED", "1") == "1"
+VERDICT_TABLE_DIR = f"{DATA_DIR}/verdict_tables"
+
+DATABASE_PATH = f"{DATA_DIR}/consistency.db"
+CHROMA_PATH = f"{DATA_DIR}/chroma"
+PROTOTYPE_CACHE_DIR = f"{DATA_DIR}/prototypes"
+
+# Vector index backend: "chroma" (one persistent HNSW collection) or "numpy"
+# (exact search over one memory-mapped matrix per session, see vector_index.py)
+VECTOR_INDEX_BACKEND = os.environ.get("VECTOR_INDEX_BACKEND", "chroma")
+VECTOR_INDEX_PATH = f"{DATA_DIR}/vectors"
+VECTOR_INDEX_HOT_SESSIONS = int(os.environ.get("VECTOR_INDEX_HOT_SESSIONS", "64"))
+
+# Per-stage timings: Prometheus text at /metrics and a Server-Timing header.
+# With PROFILING_ENABLED, a request sent with "X-Profile: 1" is also sampled
+# every PROFILE_INTERVAL_MS and its folded stacks written to PROFILE_DIR.
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") == "1"
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = f"{DATA_DIR}/profiles"
+
+# SQLite connection tuning (applied to every pooled connection)
+SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", "16384"))
+
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+# "torch" or "onnx". The ONNX backend runs an int8-quantized export of the same
+# model on ONNX Runtime (pip install "sentence-transformers[onnx]"); check it
+# with python -m backend.embedding_parity before switching.
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_FILE = os.environ.get("EMBEDDING_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+EMBEDDING_PARITY_MIN_COSINE = float(os.environ.get("EMBEDDING_PARITY_MIN_COSINE", "0.98"))
+
+# Encoder micro-batching: model calls from concurrent requests are queued and
+# run by one thread as a single batch of up to ENCODER_MAX_BATCH texts, waiting
+# at most ENCODER_MAX_WAIT_MS for more to arrive. ENCODER_THREADS fixes torch's
+# intra-op thread pool (0 keeps torch's default). A caller gives up on its
+# vectors after ENCODER_TIMEOUT_SECONDS.
+ENCODER_BATCHING_ENABLED = os.environ.get("ENCODER_BATCHING_ENABLED", "1") == "1"
+ENCODER_MAX_BATCH = int(os.environ.get("ENCODER_MAX_BATCH", "64"))
+ENCODER_MAX_WAIT_MS = float(os.environ.get("ENCODER_MAX_WAIT_MS", "2"))
+ENCODER_THREADS = int(os.environ.get("ENCODER_THREADS", "4"))
+ENCODER_TIMEOUT_SECONDS = float(os.environ.get("ENCODER_TIMEOUT_SECONDS", "60"))
 
 # Multi-framework support
 FRAMEWORKS = {
@@ -192,3 +321,5 @@ LIKERT_SCALE = {
 # Ensure data directory exists
 Path(DATABASE_PATH).parent.mkdir(parents=True, exist_ok=True)
 Path(CHROMA_PATH).mkdir(parents=True, exist_ok=True)
+Path(PROTOTYPE_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+Path(VECTOR_INDEX_PATH).mkdir(parents=True, exist_ok=True)
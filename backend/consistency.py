@@ -1,36 +1,227 @@
+from __future__ import annotations
+
+import contextvars
+import hashlib
 import json
-import os
+import logging
+import re
+import threading
+import time
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from functools import partial
 
 import requests
+from requests.adapters import HTTPAdapter
 
-from backend.config import ANTHROPIC_API_KEY, GEMINI_API_KEY
+from backend import database, llm_router, llm_scheduler, metrics, verdict_cache, verdict_table
+from backend.config import (
+    ANTHROPIC_API_KEY,
+    ANTHROPIC_BASE_URL,
+    CONSISTENCY_DEADLINE_SECONDS,
+    GEMINI_API_BASE,
+    GEMINI_API_KEY,
+    LLM_BATCH_SIZE,
+    LLM_MAX_CONCURRENCY,
+    LIKERT_SCALE,
+    LLM_PROVIDER_ORDER,
+    PREFILTER_ENABLED,
+    PREFILTER_INFERENCE_ENABLED,
+    PREFILTER_INFERENCE_SIMILARITY,
+    PREFILTER_NLI_MODEL,
+    PREFILTER_NLI_THRESHOLD,
+    PREFILTER_PARAPHRASE_SIMILARITY,
+)
+from backend.models import QuestionResponse
 
-SYSTEM_PROMPT = (
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL = "gemini-2.5-flash"
+ANTHROPIC_MODEL = "claude-sonnet-4-20250514"
+
+_COACH_INSTRUCTIONS = (
     "You are a self-assessment coach analyzing responses against Amazon's Leadership Principles. "
     "Given two Likert-scale self-assessment statements, determine if the answers are logically "
     "consistent with each other. Consider that some statements may be inversely related "
     "(e.g., claiming 'I always take ownership' but also agreeing 'I wait for others to assign me tasks' "
     "would be contradictory). Surface blind spots in self-perception. "
     "Be strict — flag subtle contradictions that reveal gaps between stated values and actual behavior. "
-    "Return ONLY valid JSON with two fields: "
+)
+
+SYSTEM_PROMPT = (
+    _COACH_INSTRUCTIONS
+    + "Return ONLY valid JSON with two fields: "
     '"is_consistent" (boolean) and "explanation" (string, 1-2 sentences).'
 )
 
+BATCH_SYSTEM_PROMPT = (
+    _COACH_INSTRUCTIONS
+    + "You will be given one new statement and a numbered list of earlier statements. "
+    "Judge the new statement against each earlier statement separately. "
+    "Return ONLY a valid JSON array with one object per earlier statement, each with three fields: "
+    '"index" (integer, the number of the earlier statement), '
+    '"is_consistent" (boolean) and "explanation" (string, 1-2 sentences).'
+)
 
-def _parse_json_response(text: str) -> dict:
+# Cached verdicts are only reused while the prompts that produced them are unchanged
+PROMPT_HASH = hashlib.sha256(
+    (SYSTEM_PROMPT + BATCH_SYSTEM_PROMPT).encode("utf-8")
+).hexdigest()[:16]
+
+_gemini_session: requests.Session | None = None
+_anthropic_client = None
+_nli_model = None
+_executor: ThreadPoolExecutor | None = None
+_init_lock = threading.Lock()
+
+
+def _get_gemini_session() -> requests.Session:
+    global _gemini_session
+    if _gemini_session is None:
+        with _init_lock:
+            if _gemini_session is None:
+                session = requests.Session()
+                # Keep-alive pool sized so every concurrent check reuses a connection
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=LLM_MAX_CONCURRENCY)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _gemini_session = session
+    return _gemini_session
+
+
+def _get_anthropic_client():
+    global _anthropic_client
+    if _anthropic_client is None:
+        with _init_lock:
+            if _anthropic_client is None:
+                import anthropic
+
+                # No SDK retries: the router and the job queue decide what to retry
+                _anthropic_client = anthropic.Anthropic(
+                    api_key=ANTHROPIC_API_KEY,
+                    base_url=ANTHROPIC_BASE_URL,
+                    max_retries=0,
+                )
+    return _anthropic_client
+
+
+def _get_nli_model():
+    global _nli_model
+    if _nli_model is None:
+        with _init_lock:
+            if _nli_model is None:
+                from sentence_transformers import CrossEncoder
+
+                _nli_model = CrossEncoder(PREFILTER_NLI_MODEL)
+    return _nli_model
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _init_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="consistency"
+                )
+    return _executor
+
+
+def _strip_code_fence(text: str) -> str:
     text = text.strip()
     if text.startswith("```"):
         text = text.split("\n", 1)[1] if "\n" in text else text[3:]
         if text.endswith("```"):
             text = text[:-3]
         text = text.strip()
-    result = json.loads(text)
+    return text
+
+
+def _parse_json_response(text: str) -> dict:
+    result = json.loads(_strip_code_fence(text))
+    if not isinstance(result.get("is_consistent"), bool):
+        raise ValueError("Verdict has no boolean is_consistent")
     return {
-        "is_consistent": bool(result.get("is_consistent", True)),
+        "is_consistent": result["is_consistent"],
         "explanation": str(result.get("explanation", "No explanation provided")),
+        "tier": "llm",
     }
 
 
+def _decode_json_items(text: str) -> list:
+    """
+    Decode the items of a JSON array, tolerating truncated output.
+
+    Well-formed responses are decoded in one go. If the model was cut off
+    mid-array (or wrapped it in prose), fall back to decoding objects one at a
+    time from the first '[' and keep every object that parsed completely.
+    """
+    try:
+        parsed = json.loads(text)
+    except json.JSONDecodeError:
+        parsed = None
+
+    if isinstance(parsed, list):
+        return parsed
+    if isinstance(parsed, dict):
+        for value in parsed.values():
+            if isinstance(value, list):
+                return value
+        return [parsed]
+
+    start = text.find("[")
+    if start == -1:
+        return []
+    decoder = json.JSONDecoder()
+    items = []
+    pos = start + 1
+    while pos < len(text):
+        while pos < len(text) and text[pos] in " \t\r\n,":
+            pos += 1
+        if pos >= len(text) or text[pos] == "]":
+            break
+        try:
+            item, pos = decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            break
+        items.append(item)
+    return items
+
+
+def _parse_json_array_response(text: str, count: int) -> dict[int, dict]:
+    """
+    Parse a batch verdict array into {index: verdict} for indexes 1..count.
+
+    Items that are not objects, carry an out-of-range or duplicate index, or
+    lack a real boolean verdict are dropped, so callers can re-check whatever
+    pairs are missing instead of trusting a guessed default.
+    """
+    verdicts: dict[int, dict] = {}
+    for item in _decode_json_items(_strip_code_fence(text)):
+        if not isinstance(item, dict):
+            continue
+        try:
+            index = int(item.get("index"))
+        except (TypeError, ValueError):
+            continue
+        if index < 1 or index > count or index in verdicts:
+            continue
+
+        is_consistent = item.get("is_consistent")
+        if isinstance(is_consistent, str) and is_consistent.lower() in ("true", "false"):
+            is_consistent = is_consistent.lower() == "true"
+        if not isinstance(is_consistent, bool):
+            continue
+
+        verdicts[index] = {
+            "is_consistent": is_consistent,
+            "explanation": str(item.get("explanation", "No explanation provided")),
+            "tier": "llm",
+        }
+    return verdicts
+
+
 def _build_user_prompt(q1_text: str, q1_answer: str, q2_text: str, q2_answer: str) -> str:
     return (
         f"Question 1: {q1_text}\n"
@@ -40,53 +231,614 @@ def _build_user_prompt(q1_text: str, q1_answer: str, q2_text: str, q2_answer: st
     )
 
 
-def _check_with_gemini(q1_text: str, q1_answer: str, q2_text: str, q2_answer: str) -> dict:
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={GEMINI_API_KEY}"
-    headers = {"Content-Type": "application/json"}
-    user_prompt = _build_user_prompt(q1_text, q1_answer, q2_text, q2_answer)
+def _build_batch_user_prompt(
+    text: str, answer: str, neighbors: list[QuestionResponse]
+) -> str:
+    lines = [f"New statement: {text}", f"Answer: {answer}", "", "Earlier statements:"]
+    for i, neighbor in enumerate(neighbors, start=1):
+        lines.append(f"[{i}] {neighbor.text}")
+        lines.append(f"Answer: {neighbor.answer}")
+    return "\n".join(lines)
+
+
+@contextmanager
+def _llm_call(provider: str) -> Iterator[None]:
+    """Count and time one provider API call."""
+    metrics.inc("mirror_llm_requests_total", provider=provider)
+    try:
+        with metrics.stage(f"llm.{provider}"):
+            yield
+    except Exception:
+        metrics.inc("mirror_llm_errors_total", provider=provider)
+        raise
+
+
+def _generate_with_gemini(system: str, user_prompt: str, max_tokens: int, timeout: float) -> str:
+    url = f"{GEMINI_API_BASE}/v1beta/models/{GEMINI_MODEL}:generateContent"
+    # In a header rather than the query string, so the key never shows up in
+    # error messages that quote the URL
+    headers = {"Content-Type": "application/json", "x-goog-api-key": GEMINI_API_KEY}
     payload = {
-        "contents": [{"parts": [{"text": f"{SYSTEM_PROMPT}\n\n{user_prompt}"}]}],
-        "generationConfig": {"temperature": 0.1, "maxOutputTokens": 1024},
+        "contents": [{"parts": [{"text": f"{system}\n\n{user_prompt}"}]}],
+        "generationConfig": {"temperature": 0.1, "maxOutputTokens": max_tokens},
     }
-    resp = requests.post(url, headers=headers, json=payload, timeout=30)
-    resp.raise_for_status()
-    data = resp.json()
+    with _llm_call("gemini"):
+        resp = _get_gemini_session().post(
+            url, headers=headers, json=payload, timeout=timeout
+        )
+        resp.raise_for_status()
+        data = resp.json()
     # Gemini 2.5 may return multiple parts (thinking + response). Get the last text part.
     parts = data["candidates"][0]["content"]["parts"]
-    text = parts[-1]["text"]
-    return _parse_json_response(text)
+    return parts[-1]["text"]
 
 
-def _check_with_anthropic(q1_text: str, q1_answer: str, q2_text: str, q2_answer: str) -> dict:
-    import anthropic
+def _generate_with_anthropic(system: str, user_prompt: str, max_tokens: int, timeout: float) -> str:
+    client = _get_anthropic_client()
+    with _llm_call("anthropic"):
+        response = client.messages.create(
+            model=ANTHROPIC_MODEL,
+            max_tokens=max_tokens,
+            system=system,
+            messages=[{"role": "user", "content": user_prompt}],
+            timeout=timeout,
+        )
+    return response.content[0].text
 
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
-    user_prompt = _build_user_prompt(q1_text, q1_answer, q2_text, q2_answer)
-    response = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=256,
-        system=SYSTEM_PROMPT,
-        messages=[{"role": "user", "content": user_prompt}],
+
+def _configured_providers() -> list[str]:
+    keys = {"gemini": GEMINI_API_KEY, "anthropic": ANTHROPIC_API_KEY}
+    return [name for name in LLM_PROVIDER_ORDER if keys.get(name)]
+
+
+def _estimate_tokens(text: str) -> int:
+    # About four characters per token for English prose
+    return len(text) // 4 + 1
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status == 429
+
+
+def _metered(
+    provider: str, generate, system: str, user_prompt: str, max_tokens: int, timeout: float
+) -> str:
+    """Call a provider and settle its rate-limit charge with the tokens actually used."""
+    prompt_tokens = _estimate_tokens(system + user_prompt)
+    try:
+        text = generate(system, user_prompt, max_tokens, timeout)
+    except Exception as e:
+        if _is_rate_limited(e):
+            llm_scheduler.throttled(provider)
+        raise
+    llm_scheduler.settle(
+        provider, prompt_tokens + max_tokens, prompt_tokens + _estimate_tokens(text)
+    )
+    return text
+
+
+def _generate(
+    system: str, user_prompt: str, max_tokens: dict[str, int],
+    deadline_at: float | None = None,
+) -> str:
+    """Send one prompt through the provider router; raises llm_router.ProviderError."""
+    generators = {"gemini": _generate_with_gemini, "anthropic": _generate_with_anthropic}
+    prompt_tokens = _estimate_tokens(system + user_prompt)
+    calls = [
+        (
+            name,
+            partial(_metered, name, generators[name], system, user_prompt, max_tokens[name]),
+            prompt_tokens + max_tokens[name],
+        )
+        for name in _configured_providers()
+    ]
+    _, text = llm_router.route(calls, deadline_at)
+    return text
+
+
+def _no_key_result() -> dict:
+    return {
+        "is_consistent": True,
+        "explanation": "No API key configured - skipping consistency check",
+        "tier": "none",
+    }
+
+
+def error_reason(error: Exception | str) -> str:
+    """
+    A reason safe to show users: the router's provider names and statuses, or
+    just the error's type. Anything else is logged here instead.
+    """
+    if isinstance(error, str) or isinstance(error, llm_router.ProviderError):
+        return str(error)
+    logger.warning("Consistency check failed", exc_info=error)
+    return type(error).__name__
+
+
+def error_result(error: Exception | str) -> dict:
+    """An unknown verdict: the pair could not be judged, so no edge is stored."""
+    return {
+        "is_consistent": None,
+        "explanation": f"Could not check consistency: {error_reason(error)}",
+        "tier": "error",
+    }
+
+
+def _stance(answer: str) -> int:
+    """+1 for agreement, -1 for disagreement, 0 for neutral or unknown answers."""
+    score = LIKERT_SCALE.get(answer)
+    if score is None:
+        return 0
+    midpoint = LIKERT_SCALE["Neutral"]
+    return (score > midpoint) - (score < midpoint)
+
+
+# Words that flip or weaken a claim. Sentence embeddings barely register them,
+# so "I always plan ahead" and "I never plan ahead" look like paraphrases.
+_NEGATIONS = frozenset({
+    "not", "no", "never", "none", "nobody", "nothing", "nowhere", "neither", "nor",
+    "without", "cannot", "rarely", "seldom", "hardly", "barely", "scarcely",
+})
+_WORD = re.compile(r"[a-z0-9']+")
+
+
+def _words(text: str) -> tuple[str, ...]:
+    return tuple(_WORD.findall(text.lower().replace("\u2019", "'")))
+
+
+def _same_claim(text: str, other: str) -> bool:
+    """
+    Whether two near-paraphrases can be trusted to make the same claim: their
+    normalized words are identical, or neither contains a negation.
+    """
+    words, other_words = _words(text), _words(other)
+    if words == other_words:
+        return True
+    return not any(
+        word in _NEGATIONS or word.endswith("n't") for word in words + other_words
     )
-    text = response.content[0].text
-    return _parse_json_response(text)
+
+
+def _stance_sentence(text: str, answer: str) -> str | None:
+    stance = _stance(answer)
+    if stance > 0:
+        return text
+    if stance < 0:
+        return f"It is false that: {text}"
+    return None
+
+
+def _nli_label_index(model, label: str, default: int) -> int:
+    id2label = getattr(getattr(model, "config", None), "id2label", None) or {}
+    for index, name in id2label.items():
+        if str(name).lower() == label:
+            return int(index)
+    return default
+
+
+# Edge tiers judged by a model rather than derived locally
+_EVIDENCE_TIERS = ("llm", "table")
+
+
+def _infer_from_duplicates(
+    text: str,
+    answer: str,
+    neighbors: list[QuestionResponse],
+    remaining: list[QuestionResponse],
+    similarities: dict[str, float],
+) -> dict[str, dict]:
+    """
+    Verdicts for remaining neighbors implied by the session's edge graph.
+
+    Neighbors at least PREFILTER_INFERENCE_SIMILARITY similar to the new
+    statement, making the same claim (see _same_claim) and answered in the
+    same direction are its duplicates, so their judged edges to the remaining
+    neighbors carry over. A pair is inferred only when every duplicate that
+    has an edge to it agrees. Only LLM and verdict-table edges count as
+    evidence, never local or inferred ones, so mistakes do not propagate.
+    """
+    stance = _stance(answer)
+    if stance == 0 or not remaining:
+        return {}
+    duplicates = {
+        neighbor.id: neighbor for neighbor in neighbors
+        if similarities.get(neighbor.id, 0.0) >= PREFILTER_INFERENCE_SIMILARITY
+        and _stance(neighbor.answer) == stance
+        and _same_claim(text, neighbor.text)
+    }
+    if not duplicates:
+        return {}
+
+    remaining_ids = {neighbor.id for neighbor in remaining}
+    evidence: dict[str, list[tuple[float, dict, QuestionResponse]]] = {}
+    for edge in database.get_edges_between(list(duplicates), list(remaining_ids)):
+        if edge["tier"] not in _EVIDENCE_TIERS:
+            continue
+        for duplicate_id, target_id in (
+            (edge["source_id"], edge["target_id"]), (edge["target_id"], edge["source_id"])
+        ):
+            if duplicate_id in duplicates and target_id in remaining_ids:
+                evidence.setdefault(target_id, []).append(
+                    (similarities[duplicate_id], edge, duplicates[duplicate_id])
+                )
+
+    verdicts = {}
+    for target_id, votes in evidence.items():
+        # Duplicates that disagree leave the pair genuinely uncertain
+        if len({edge["is_consistent"] for _, edge, _ in votes}) > 1:
+            continue
+        _, edge, duplicate = max(votes, key=lambda vote: vote[0])
+        verdicts[target_id] = {
+            "is_consistent": edge["is_consistent"],
+            "explanation": (
+                f'Inferred from "{duplicate.text}", answered the same way: {edge["explanation"]}'
+            ),
+            "tier": "inferred",
+        }
+    return verdicts
+
+
+@metrics.timed("prefilter")
+def prefilter(
+    text: str,
+    answer: str,
+    neighbors: list[QuestionResponse],
+    similarities: dict[str, float] | None = None,
+) -> tuple[dict[str, dict], list[QuestionResponse]]:
+    """
+    Settle obviously (in)consistent pairs locally, before any LLM call.
+
+    Tier "table": pairs of question-bank prompts are answered from the
+    offline verdict table (see verdict_table.py) for the current prompt.
+    Tier "likert": near-paraphrases (cosine similarity of at least
+    PREFILTER_PARAPHRASE_SIMILARITY) that make the same claim (see
+    _same_claim) and are answered in the same direction are consistent. Only
+    statements with identical wording answered in opposite directions are
+    contradictory; similarity alone never settles a contradiction.
+    Tier "inferred" (unless PREFILTER_INFERENCE_ENABLED is off): verdicts
+    carried over from existing edges of a near-duplicate statement answered
+    the same way; see _infer_from_duplicates.
+    Tier "nli" (only when PREFILTER_NLI_MODEL is set): a local cross-encoder
+    compares the two stated stances, and only predictions above
+    PREFILTER_NLI_THRESHOLD are kept.
+
+    Returns the local verdicts keyed by neighbor id and the neighbors that
+    still need the LLM.
+    """
+    verdicts: dict[str, dict] = {}
+    for neighbor in neighbors:
+        known = verdict_table.lookup(text, answer, neighbor.text, neighbor.answer, PROMPT_HASH)
+        if known is not None:
+            verdicts[neighbor.id] = known
+    if not PREFILTER_ENABLED:
+        return verdicts, [neighbor for neighbor in neighbors if neighbor.id not in verdicts]
+
+    similarities = similarities or {}
+    stance = _stance(answer)
+    for neighbor in neighbors:
+        if neighbor.id in verdicts:
+            continue
+        similarity = similarities.get(neighbor.id)
+        other = _stance(neighbor.answer)
+        if similarity is None or similarity < PREFILTER_PARAPHRASE_SIMILARITY:
+            continue
+        if stance == 0 or other == 0:
+            continue
+        if stance == other and _same_claim(text, neighbor.text):
+            verdicts[neighbor.id] = {
+                "is_consistent": True,
+                "explanation": "Both statements say nearly the same thing and are answered the same way.",
+                "tier": "likert",
+            }
+        elif stance != other and _words(text) == _words(neighbor.text):
+            verdicts[neighbor.id] = {
+                "is_consistent": False,
+                "explanation": "The same statement is answered in opposite directions.",
+                "tier": "likert",
+            }
+
+    remaining = [neighbor for neighbor in neighbors if neighbor.id not in verdicts]
+    if PREFILTER_INFERENCE_ENABLED:
+        verdicts.update(_infer_from_duplicates(
+            text, answer, neighbors, remaining, similarities
+        ))
+        remaining = [neighbor for neighbor in remaining if neighbor.id not in verdicts]
+
+    premise = _stance_sentence(text, answer)
+    if PREFILTER_NLI_MODEL and premise and remaining:
+        candidates = [
+            (neighbor, hypothesis)
+            for neighbor in remaining
+            if (hypothesis := _stance_sentence(neighbor.text, neighbor.answer))
+        ]
+        try:
+            model = _get_nli_model()
+            probabilities = model.predict(
+                [(premise, hypothesis) for _, hypothesis in candidates], apply_softmax=True
+            ) if candidates else []
+        except Exception:
+            logger.exception("NLI pre-filter failed; escalating pairs to the LLM")
+            probabilities = []
+
+        if len(probabilities):
+            contradiction = _nli_label_index(model, "contradiction", 0)
+            entailment = _nli_label_index(model, "entailment", 1)
+            for (neighbor, _), probs in zip(candidates, probabilities):
+                if probs[contradiction] >= PREFILTER_NLI_THRESHOLD:
+                    verdicts[neighbor.id] = {
+                        "is_consistent": False,
+                        "explanation": "A local entailment model found these answers contradict each other.",
+                        "tier": "nli",
+                    }
+                elif probs[entailment] >= PREFILTER_NLI_THRESHOLD:
+                    verdicts[neighbor.id] = {
+                        "is_consistent": True,
+                        "explanation": "A local entailment model found these answers support each other.",
+                        "tier": "nli",
+                    }
+        remaining = [neighbor for neighbor in remaining if neighbor.id not in verdicts]
+
+    return verdicts, remaining
+
+
+def active_model() -> str | None:
+    """The routed provider models, in order; verdicts are cached under this name."""
+    models = {"gemini": GEMINI_MODEL, "anthropic": ANTHROPIC_MODEL}
+    providers = _configured_providers()
+    if not providers:
+        return None
+    return "+".join(f"{name}:{models[name]}" for name in providers)
+
+
+def _cache_key(q1_text: str, q1_answer: str, q2_text: str, q2_answer: str) -> str:
+    return verdict_cache.make_key(
+        q1_text, q1_answer, q2_text, q2_answer, active_model() or "", PROMPT_HASH
+    )
+
+
+def _judge_pair(
+    q1_text: str, q1_answer: str, q2_text: str, q2_answer: str,
+    deadline_at: float | None = None,
+) -> dict:
+    user_prompt = _build_user_prompt(q1_text, q1_answer, q2_text, q2_answer)
+    result = _parse_json_response(_generate(
+        SYSTEM_PROMPT, user_prompt, {"gemini": 1024, "anthropic": 256}, deadline_at
+    ))
+    verdict_cache.put(_cache_key(q1_text, q1_answer, q2_text, q2_answer), result)
+    return result
+
+
+def _check_pair_uncached(
+    text: str, answer: str, neighbor: QuestionResponse, deadline_at: float | None = None
+) -> dict:
+    try:
+        return _judge_pair(text, answer, neighbor.text, neighbor.answer, deadline_at)
+    except Exception as e:
+        return error_result(e)
 
 
 def check_consistency(
-    q1_text: str, q1_answer: str, q2_text: str, q2_answer: str
+    q1_text: str, q1_answer: str, q2_text: str, q2_answer: str,
+    similarity: float | None = None,
 ) -> dict:
+    other = QuestionResponse(id="", text=q2_text, answer=q2_answer, category="", created_at="")
+    local, _ = prefilter(q1_text, q1_answer, [other], {"": similarity} if similarity is not None else None)
+    if local:
+        return local[""]
+
+    if active_model() is None:
+        return _no_key_result()
+
+    cached = verdict_cache.get(_cache_key(q1_text, q1_answer, q2_text, q2_answer))
+    if cached is not None:
+        return cached
+
     try:
-        if GEMINI_API_KEY:
-            return _check_with_gemini(q1_text, q1_answer, q2_text, q2_answer)
-        elif ANTHROPIC_API_KEY:
-            return _check_with_anthropic(q1_text, q1_answer, q2_text, q2_answer)
-        else:
-            return {
-                "is_consistent": True,
-                "explanation": "No API key configured - skipping consistency check",
-            }
+        return _judge_pair(q1_text, q1_answer, q2_text, q2_answer)
     except Exception as e:
-        return {
-            "is_consistent": True,
-            "explanation": f"Error checking consistency: {str(e)}",
-        }
+        return error_result(e)
+
+
+def check_consistency_batch(
+    text: str, answer: str, neighbors: list[QuestionResponse],
+    deadline_at: float | None = None,
+) -> dict[str, dict]:
+    """
+    Judge one statement against several neighbors in a single LLM request.
+
+    Returns verdicts keyed by neighbor id. Pairs the model skipped or answered
+    with a malformed item are left out of the result; provider errors are
+    raised to the caller.
+    """
+    if not neighbors:
+        return {}
+    if active_model() is None:
+        return {neighbor.id: _no_key_result() for neighbor in neighbors}
+
+    user_prompt = _build_batch_user_prompt(text, answer, neighbors)
+    raw = _generate(
+        BATCH_SYSTEM_PROMPT, user_prompt,
+        {"gemini": 1024 + 256 * len(neighbors), "anthropic": 160 * len(neighbors)},
+        deadline_at,
+    )
+
+    by_index = _parse_json_array_response(raw, len(neighbors))
+    verdicts: dict[str, dict] = {}
+    for index, verdict in by_index.items():
+        neighbor = neighbors[index - 1]
+        verdict_cache.put(_cache_key(text, answer, neighbor.text, neighbor.answer), verdict)
+        verdicts[neighbor.id] = verdict
+    return verdicts
+
+
+def judge_neighbors(
+    text: str, answer: str, neighbors: list[QuestionResponse],
+    deadline_at: float | None = None,
+) -> dict[str, dict]:
+    """
+    Judge one statement against a batch of neighbors, raising on provider errors.
+
+    Unlike check_consistency_many this never substitutes a fallback verdict,
+    so callers (the background job queue) can retry failures instead of
+    recording them. deadline_at (a time.monotonic() timestamp) bounds every
+    provider call, including rate-limit waits.
+    """
+    if active_model() is None:
+        return {neighbor.id: _no_key_result() for neighbor in neighbors}
+
+    keys = {
+        neighbor.id: _cache_key(text, answer, neighbor.text, neighbor.answer)
+        for neighbor in neighbors
+    }
+    cached = verdict_cache.get_many(list(keys.values()))
+    verdicts = {
+        neighbor.id: cached[keys[neighbor.id]]
+        for neighbor in neighbors
+        if keys[neighbor.id] in cached
+    }
+
+    uncached = [neighbor for neighbor in neighbors if neighbor.id not in verdicts]
+    if len(uncached) > 1:
+        verdicts.update(check_consistency_batch(text, answer, uncached, deadline_at))
+    for neighbor in uncached:
+        if neighbor.id not in verdicts:
+            verdicts[neighbor.id] = _judge_pair(
+                text, answer, neighbor.text, neighbor.answer, deadline_at
+            )
+    return verdicts
+
+
+def _check_chunk(
+    text: str, answer: str, chunk: list[QuestionResponse], deadline_at: float | None,
+    cancelled: threading.Event | None = None,
+) -> dict[str, dict]:
+    def check_pair(neighbor: QuestionResponse) -> dict:
+        if cancelled is not None and cancelled.is_set():
+            return error_result("cancelled")
+        return _check_pair_uncached(text, answer, neighbor, deadline_at)
+
+    if len(chunk) == 1:
+        return {chunk[0].id: check_pair(chunk[0])}
+    if cancelled is not None and cancelled.is_set():
+        return {neighbor.id: error_result("cancelled") for neighbor in chunk}
+    try:
+        verdicts = check_consistency_batch(text, answer, chunk, deadline_at)
+    except Exception as e:
+        return {neighbor.id: error_result(e) for neighbor in chunk}
+    # Re-check pairs the batch response left out, one at a time
+    for neighbor in chunk:
+        if neighbor.id not in verdicts:
+            verdicts[neighbor.id] = check_pair(neighbor)
+    return verdicts
+
+
+def submit_consistency_checks(
+    text: str,
+    answer: str,
+    neighbors: list[QuestionResponse],
+    similarities: dict[str, float] | None = None,
+    deadline_at: float | None = None,
+    use_prefilter: bool = True,
+    cancelled: threading.Event | None = None,
+) -> tuple[dict[str, dict], list[Future]]:
+    """
+    Start checking one statement against its neighbors without waiting.
+
+    Returns the verdicts already available (pre-filter and cache hits, or
+    no-key fallbacks) and one future per batch of LLM_BATCH_SIZE remaining
+    neighbors, each resolving to {neighbor_id: verdict}. similarities maps
+    neighbor ids to cosine similarity for the pre-filter, and deadline_at (a
+    time.monotonic() timestamp) bounds the provider calls, and use_prefilter=False
+    skips the local tiers so every verdict comes from the cache or the LLM.
+    Callers own the futures and should cancel whatever they stop waiting for;
+    a future already running only notices once cancelled is set, and then
+    sends no further LLM calls, reporting the pairs left as unknown.
+    """
+    local = {}
+    if use_prefilter:
+        local, neighbors = prefilter(text, answer, neighbors, similarities)
+    if active_model() is None:
+        return {**local, **{neighbor.id: _no_key_result() for neighbor in neighbors}}, []
+
+    keys = {
+        neighbor.id: _cache_key(text, answer, neighbor.text, neighbor.answer)
+        for neighbor in neighbors
+    }
+    cached = verdict_cache.get_many(list(keys.values()))
+    ready = dict(local)
+    ready.update({
+        neighbor.id: cached[keys[neighbor.id]]
+        for neighbor in neighbors
+        if keys[neighbor.id] in cached
+    })
+
+    uncached = [neighbor for neighbor in neighbors if neighbor.id not in ready]
+    executor = _get_executor()
+    futures = [
+        executor.submit(
+            contextvars.copy_context().run,
+            _check_chunk, text, answer, uncached[i:i + LLM_BATCH_SIZE], deadline_at, cancelled,
+        )
+        for i in range(0, len(uncached), LLM_BATCH_SIZE)
+    ]
+    return ready, futures
+
+
+def check_consistency_groups(
+    groups: list[tuple[str, str, list[QuestionResponse]]],
+    deadline: float = CONSISTENCY_DEADLINE_SECONDS,
+    similarities: list[dict[str, float]] | None = None,
+    use_prefilter: bool = True,
+) -> list[dict[str, dict]]:
+    """
+    Check several (text, answer, neighbors) groups under one shared deadline.
+
+    Pre-filter and cached verdicts are served first. The remaining neighbors are judged in
+    batches of LLM_BATCH_SIZE, with the batches of every group sent
+    concurrently, and pairs a batch response left out are re-checked one at a
+    time. Returns one {neighbor_id: verdict} dict per group; anything still
+    pending when the deadline expires is cancelled and reported as unknown.
+    use_prefilter=False skips the local tiers (see submit_consistency_checks).
+    """
+    deadline_at = time.monotonic() + deadline
+    similarities = similarities or [None] * len(groups)
+    submitted = [
+        submit_consistency_checks(
+            text, answer, neighbors, group_similarities, deadline_at, use_prefilter
+        )
+        for (text, answer, neighbors), group_similarities in zip(groups, similarities)
+    ]
+    all_futures = [future for _, futures in submitted for future in futures]
+    done, _ = wait(all_futures, timeout=deadline)
+
+    results = []
+    for (_, _, neighbors), (ready, futures) in zip(groups, submitted):
+        verdicts = dict(ready)
+        for future in futures:
+            if future in done:
+                verdicts.update(future.result())
+            else:
+                future.cancel()
+        results.append({
+            neighbor.id: verdicts.get(neighbor.id, error_result("deadline exceeded"))
+            for neighbor in neighbors
+        })
+    return results
+
+
+def check_consistency_many(
+    text: str,
+    answer: str,
+    neighbors: list[QuestionResponse],
+    deadline: float = CONSISTENCY_DEADLINE_SECONDS,
+    similarities: dict[str, float] | None = None,
+) -> dict[str, dict]:
+    """Check one statement against several neighbors; see check_consistency_groups."""
+    if not neighbors:
+        return {}
+    return check_consistency_groups(
+        [(text, answer, neighbors)], deadline, [similarities or {}]
+    )[0]
@@ -1,162 +1,721 @@
 from __future__ import annotations
 
 import sqlite3
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
 from datetime import datetime
+from uuid import uuid4
 
-from backend.config import DATABASE_PATH
+from backend import metrics
+from backend.config import (
+    DATABASE_PATH,
+    DEFAULT_FRAMEWORK,
+    SQLITE_CACHE_SIZE_KB,
+    SQLITE_MMAP_SIZE,
+)
 from backend.models import (
     CREATE_EDGES_TABLE,
+    CREATE_EMBEDDING_CACHE_INDEX,
+    CREATE_EMBEDDING_CACHE_TABLE,
+    CREATE_GRAPH_CHANGE_TRIGGERS,
+    CREATE_GRAPH_CHANGES_TABLE,
+    CREATE_GRAPH_VERSIONS_TABLE,
+    CREATE_JOB_TASKS_INDEXES,
+    CREATE_JOB_TASKS_TABLE,
+    CREATE_JOBS_TABLE,
+    CREATE_LOOKUP_INDEXES,
     CREATE_QUESTIONS_TABLE,
+    CREATE_RATE_BUCKETS_TABLE,
+    CREATE_SCHEMA_VERSION_TABLE,
+    CREATE_VERDICT_CACHE_INDEX,
+    CREATE_VERDICT_CACHE_TABLE,
     QuestionResponse,
 )
 
+# One long-lived connection per thread. FastAPI runs sync endpoints on a
+# reused threadpool, so each worker thread keeps its connection (and its
+# prepared-statement cache) for the life of the process.
+_local = threading.local()
 
-def _get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DATABASE_PATH)
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DATABASE_PATH, timeout=10.0, cached_statements=256)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON")
+    # WAL lets readers proceed while a writer holds the lock
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
     return conn
 
 
-def init_db() -> None:
+def _get_conn() -> sqlite3.Connection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = _connect()
+        _local.conn = conn
+        _local.depth = 0
+    return conn
+
+
+@contextmanager
+def transaction(immediate: bool = False) -> Iterator[sqlite3.Connection]:
+    """
+    Run the enclosed writes in a single transaction on this thread's connection.
+
+    Nested uses join the outermost transaction, so a request can wrap several
+    helpers (e.g. add_question and add_edges) and commit them together.
+    immediate=True takes the write lock up front, for read-then-write steps
+    that must not interleave with other processes.
+    """
     conn = _get_conn()
+    depth = _local.depth
+    if immediate and depth == 0:
+        conn.execute("BEGIN IMMEDIATE")
+    _local.depth = depth + 1
     try:
-        conn.execute(CREATE_QUESTIONS_TABLE)
-        conn.execute(CREATE_EDGES_TABLE)
-        # Ensure session_id columns exist on old DBs
-        for col_sql in [
-            "ALTER TABLE questions ADD COLUMN session_id TEXT NOT NULL DEFAULT 'default'",
-            "ALTER TABLE consistency_edges ADD COLUMN session_id TEXT NOT NULL DEFAULT 'default'",
-        ]:
-            try:
-                conn.execute(col_sql)
-            except Exception:
-                pass  # Column already exists
-        conn.commit()
+        yield conn
+        if depth == 0:
+            with metrics.stage("sqlite.commit"):
+                conn.commit()
+    except BaseException:
+        if depth == 0:
+            conn.rollback()
+        raise
     finally:
-        conn.close()
+        _local.depth = depth
+
+
+def _add_column_if_missing(
+    conn: sqlite3.Connection, table: str, column: str, definition: str
+) -> None:
+    columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def _migrate_base_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(CREATE_QUESTIONS_TABLE)
+    conn.execute(CREATE_EDGES_TABLE)
+    # Databases created before sessions existed lack the session_id columns
+    _add_column_if_missing(conn, "questions", "session_id", "TEXT NOT NULL DEFAULT 'default'")
+    _add_column_if_missing(
+        conn, "consistency_edges", "session_id", "TEXT NOT NULL DEFAULT 'default'"
+    )
+
+
+def _migrate_verdict_cache(conn: sqlite3.Connection) -> None:
+    conn.execute(CREATE_VERDICT_CACHE_TABLE)
+    conn.execute(CREATE_VERDICT_CACHE_INDEX)
+
+
+def _migrate_lookup_indexes(conn: sqlite3.Connection) -> None:
+    for index_sql in CREATE_LOOKUP_INDEXES:
+        conn.execute(index_sql)
+
+
+def _migrate_job_queue(conn: sqlite3.Connection) -> None:
+    conn.execute(CREATE_JOBS_TABLE)
+    conn.execute(CREATE_JOB_TASKS_TABLE)
+    for index_sql in CREATE_JOB_TASKS_INDEXES:
+        conn.execute(index_sql)
+
+
+def _migrate_edge_tier(conn: sqlite3.Connection) -> None:
+    # Which stage settled the pair: llm, likert or nli
+    _add_column_if_missing(conn, "consistency_edges", "tier", "TEXT NOT NULL DEFAULT 'llm'")
+
+
+def _migrate_graph_versions(conn: sqlite3.Connection) -> None:
+    conn.execute(CREATE_GRAPH_VERSIONS_TABLE)
+    conn.execute(CREATE_GRAPH_CHANGES_TABLE)
+    for trigger_sql in CREATE_GRAPH_CHANGE_TRIGGERS:
+        conn.execute(trigger_sql)
+
+
+def _migrate_question_framework(conn: sqlite3.Connection) -> None:
+    # Questions stored before frameworks were recorded fall back to the default one
+    _add_column_if_missing(
+        conn, "questions", "framework_id", f"TEXT NOT NULL DEFAULT '{DEFAULT_FRAMEWORK}'"
+    )
+
+
+def _migrate_embedding_cache(conn: sqlite3.Connection) -> None:
+    conn.execute(CREATE_EMBEDDING_CACHE_TABLE)
+    conn.execute(CREATE_EMBEDDING_CACHE_INDEX)
+
+
+def _migrate_rate_buckets(conn: sqlite3.Connection) -> None:
+    conn.execute(CREATE_RATE_BUCKETS_TABLE)
+
+
+def _migrate_task_tier(conn: sqlite3.Connection) -> None:
+    _add_column_if_missing(conn, "consistency_tasks", "tier", "TEXT NOT NULL DEFAULT 'llm'")
+
+
+def _migrate_task_lease(conn: sqlite3.Connection) -> None:
+    # Token of the claim a running task belongs to; only its holder may record results
+    _add_column_if_missing(conn, "consistency_tasks", "lease", "TEXT")
+
+
+# Schema migrations, applied in order. Migration N is recorded as version N in
+# schema_version; append new steps to the end and never reorder existing ones.
+MIGRATIONS = [
+    _migrate_base_tables,
+    _migrate_verdict_cache,
+    _migrate_lookup_indexes,
+    _migrate_job_queue,
+    _migrate_edge_tier,
+    _migrate_graph_versions,
+    _migrate_question_framework,
+    _migrate_embedding_cache,
+    _migrate_rate_buckets,
+    _migrate_task_tier,
+    _migrate_task_lease,
+]
+
+
+def init_db() -> None:
+    conn = _get_conn()
+    conn.execute(CREATE_SCHEMA_VERSION_TABLE)
+    conn.commit()
+    for version, migrate in enumerate(MIGRATIONS, start=1):
+        # IMMEDIATE takes the write lock up front, so concurrent workers
+        # starting together apply each migration exactly once
+        with transaction(immediate=True):
+            applied = conn.execute(
+                "SELECT 1 FROM schema_version WHERE version = ?", (version,)
+            ).fetchone()
+            if applied is None:
+                migrate(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, applied_at) VALUES (?, ?)",
+                    (version, datetime.utcnow().isoformat()),
+                )
 
 
+def _row_to_question(row: sqlite3.Row) -> QuestionResponse:
+    return QuestionResponse(
+        id=row["id"], text=row["text"], answer=row["answer"],
+        category=row["category"], created_at=row["created_at"],
+        session_id=row["session_id"], framework_id=row["framework_id"],
+    )
+
+
+@metrics.timed("sqlite")
 def add_question(
-    id: str, text: str, answer: str, category: str, session_id: str = "default"
+    id: str, text: str, answer: str, category: str, session_id: str = "default",
+    framework_id: str = DEFAULT_FRAMEWORK,
 ) -> QuestionResponse:
     created_at = datetime.utcnow().isoformat()
-    conn = _get_conn()
-    try:
+    with transaction() as conn:
         conn.execute(
-            "INSERT INTO questions (id, text, answer, category, created_at, session_id) VALUES (?, ?, ?, ?, ?, ?)",
-            (id, text, answer, category, created_at, session_id),
+            "INSERT INTO questions (id, text, answer, category, created_at, session_id, framework_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (id, text, answer, category, created_at, session_id, framework_id),
         )
-        conn.commit()
-    finally:
-        conn.close()
     return QuestionResponse(
         id=id, text=text, answer=answer, category=category,
-        created_at=created_at, session_id=session_id,
+        created_at=created_at, session_id=session_id, framework_id=framework_id,
     )
 
 
-def get_questions(session_id: str = "default") -> list[QuestionResponse]:
-    conn = _get_conn()
-    try:
-        rows = conn.execute(
-            "SELECT id, text, answer, category, created_at, session_id FROM questions "
-            "WHERE session_id = ? ORDER BY created_at",
-            (session_id,),
-        ).fetchall()
-    finally:
-        conn.close()
-    return [
-        QuestionResponse(
-            id=row["id"], text=row["text"], answer=row["answer"],
-            category=row["category"], created_at=row["created_at"],
-            session_id=row["session_id"],
+@metrics.timed("sqlite")
+def add_questions(questions: list[QuestionResponse]) -> None:
+    """Insert several already-built questions with one executemany."""
+    if not questions:
+        return
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO questions (id, text, answer, category, created_at, session_id, framework_id) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (q.id, q.text, q.answer, q.category, q.created_at, q.session_id, q.framework_id)
+                for q in questions
+            ],
         )
-        for row in rows
-    ]
 
 
+@metrics.timed("sqlite")
+def get_questions(session_id: str = "default") -> list[QuestionResponse]:
+    rows = _get_conn().execute(
+        "SELECT id, text, answer, category, created_at, session_id, framework_id FROM questions "
+        "WHERE session_id = ? ORDER BY created_at",
+        (session_id,),
+    ).fetchall()
+    return [_row_to_question(row) for row in rows]
+
+
+@metrics.timed("sqlite")
+def get_questions_in_categories(
+    session_id: str, categories: list[str]
+) -> list[QuestionResponse]:
+    if not categories:
+        return []
+    placeholders = ", ".join("?" for _ in categories)
+    rows = _get_conn().execute(
+        f"SELECT id, text, answer, category, created_at, session_id, framework_id FROM questions "
+        f"WHERE session_id = ? AND category IN ({placeholders}) ORDER BY created_at",
+        [session_id, *categories],
+    ).fetchall()
+    return [_row_to_question(row) for row in rows]
+
+
+@metrics.timed("sqlite")
 def get_question(id: str) -> QuestionResponse | None:
-    conn = _get_conn()
-    try:
-        row = conn.execute(
-            "SELECT id, text, answer, category, created_at, session_id FROM questions WHERE id = ?",
-            (id,),
-        ).fetchone()
-    finally:
-        conn.close()
+    row = _get_conn().execute(
+        "SELECT id, text, answer, category, created_at, session_id, framework_id FROM questions WHERE id = ?",
+        (id,),
+    ).fetchone()
     if row is None:
         return None
-    return QuestionResponse(
-        id=row["id"], text=row["text"], answer=row["answer"],
-        category=row["category"], created_at=row["created_at"],
-        session_id=row["session_id"],
-    )
+    return _row_to_question(row)
+
+
+@metrics.timed("sqlite")
+def get_questions_by_ids(ids: list[str]) -> dict[str, QuestionResponse]:
+    if not ids:
+        return {}
+    placeholders = ", ".join("?" for _ in ids)
+    rows = _get_conn().execute(
+        f"SELECT id, text, answer, category, created_at, session_id, framework_id FROM questions "
+        f"WHERE id IN ({placeholders})",
+        ids,
+    ).fetchall()
+    return {row["id"]: _row_to_question(row) for row in rows}
 
 
+@metrics.timed("sqlite")
 def delete_question(id: str) -> bool:
-    conn = _get_conn()
-    try:
-        delete_edges_for_question(id, conn=conn)
+    with transaction() as conn:
+        delete_edges_for_question(id)
         cursor = conn.execute("DELETE FROM questions WHERE id = ?", (id,))
-        conn.commit()
         deleted = cursor.rowcount > 0
-    finally:
-        conn.close()
     return deleted
 
 
 def add_edge(
     id: str, source_id: str, target_id: str,
-    is_consistent: bool, explanation: str, session_id: str = "default"
+    is_consistent: bool, explanation: str, session_id: str = "default",
+    tier: str = "llm",
 ) -> None:
-    conn = _get_conn()
-    try:
-        conn.execute(
-            "INSERT INTO consistency_edges (id, source_id, target_id, is_consistent, explanation, session_id) "
-            "VALUES (?, ?, ?, ?, ?, ?)",
-            (id, source_id, target_id, is_consistent, explanation, session_id),
+    add_edges([(id, source_id, target_id, is_consistent, explanation, session_id, tier)])
+
+
+@metrics.timed("sqlite")
+def add_edges(edges: list[tuple[str, str, str, bool, str, str, str]]) -> None:
+    """Insert (id, source_id, target_id, is_consistent, explanation, session_id, tier) rows."""
+    if not edges:
+        return
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT INTO consistency_edges "
+            "(id, source_id, target_id, is_consistent, explanation, session_id, tier) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            edges,
         )
-        conn.commit()
-    finally:
-        conn.close()
 
 
+def _row_to_edge(row: sqlite3.Row) -> dict:
+    return {
+        "id": row["id"],
+        "source_id": row["source_id"],
+        "target_id": row["target_id"],
+        "is_consistent": bool(row["is_consistent"]),
+        "explanation": row["explanation"],
+        "tier": row["tier"],
+    }
+
+
+@metrics.timed("sqlite")
 def get_edges(session_id: str = "default") -> list[dict]:
-    conn = _get_conn()
-    try:
-        rows = conn.execute(
-            "SELECT id, source_id, target_id, is_consistent, explanation FROM consistency_edges "
-            "WHERE session_id = ?",
-            (session_id,),
-        ).fetchall()
-    finally:
-        conn.close()
-    return [
-        {
-            "id": row["id"],
-            "source_id": row["source_id"],
-            "target_id": row["target_id"],
+    rows = _get_conn().execute(
+        "SELECT id, source_id, target_id, is_consistent, explanation, tier FROM consistency_edges "
+        "WHERE session_id = ?",
+        (session_id,),
+    ).fetchall()
+    return [_row_to_edge(row) for row in rows]
+
+
+@metrics.timed("sqlite")
+def get_edges_by_ids(ids: list[str]) -> list[dict]:
+    if not ids:
+        return []
+    placeholders = ", ".join("?" for _ in ids)
+    rows = _get_conn().execute(
+        f"SELECT id, source_id, target_id, is_consistent, explanation, tier FROM consistency_edges "
+        f"WHERE id IN ({placeholders})",
+        ids,
+    ).fetchall()
+    return [_row_to_edge(row) for row in rows]
+
+
+@metrics.timed("sqlite")
+def get_edges_between(ids: list[str], other_ids: list[str]) -> list[dict]:
+    """Edges joining any of ids to any of other_ids, stored in either direction."""
+    if not ids or not other_ids:
+        return []
+    first = ", ".join("?" for _ in ids)
+    second = ", ".join("?" for _ in other_ids)
+    rows = _get_conn().execute(
+        f"SELECT id, source_id, target_id, is_consistent, explanation, tier FROM consistency_edges "
+        f"WHERE (source_id IN ({first}) AND target_id IN ({second})) "
+        f"OR (source_id IN ({second}) AND target_id IN ({first}))",
+        [*ids, *other_ids, *other_ids, *ids],
+    ).fetchall()
+    return [_row_to_edge(row) for row in rows]
+
+
+@metrics.timed("sqlite")
+def delete_edges_for_question(question_id: str) -> None:
+    with transaction() as conn:
+        conn.execute(
+            "DELETE FROM consistency_edges WHERE source_id = ? OR target_id = ?",
+            (question_id, question_id),
+        )
+
+
+@metrics.timed("sqlite")
+def get_cached_verdicts(keys: list[str], min_created_at: float) -> dict[str, dict]:
+    if not keys:
+        return {}
+    placeholders = ", ".join("?" for _ in keys)
+    rows = _get_conn().execute(
+        f"SELECT key, is_consistent, explanation FROM verdict_cache "
+        f"WHERE key IN ({placeholders}) AND created_at >= ?",
+        (*keys, min_created_at),
+    ).fetchall()
+    return {
+        row["key"]: {
             "is_consistent": bool(row["is_consistent"]),
             "explanation": row["explanation"],
         }
         for row in rows
-    ]
+    }
 
 
-def delete_edges_for_question(
-    question_id: str, conn: sqlite3.Connection | None = None
+@metrics.timed("sqlite")
+def put_cached_verdict(
+    key: str, is_consistent: bool, explanation: str, created_at: float
 ) -> None:
-    should_close = conn is None
-    if conn is None:
-        conn = _get_conn()
-    try:
+    with transaction() as conn:
         conn.execute(
-            "DELETE FROM consistency_edges WHERE source_id = ? OR target_id = ?",
-            (question_id, question_id),
+            "INSERT OR REPLACE INTO verdict_cache (key, is_consistent, explanation, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            (key, is_consistent, explanation, created_at),
         )
-        if should_close:
-            conn.commit()
-    finally:
-        if should_close:
-            conn.close()
+
+
+@metrics.timed("sqlite")
+def prune_verdict_cache(min_created_at: float, max_entries: int) -> int:
+    with transaction() as conn:
+        expired = conn.execute(
+            "DELETE FROM verdict_cache WHERE created_at < ?", (min_created_at,)
+        ).rowcount
+        overflow = conn.execute(
+            "DELETE FROM verdict_cache WHERE key IN ("
+            "SELECT key FROM verdict_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (max_entries,),
+        ).rowcount
+    return expired + overflow
+
+
+@metrics.timed("sqlite")
+def get_cached_embeddings(keys: list[str]) -> dict[str, bytes]:
+    if not keys:
+        return {}
+    placeholders = ", ".join("?" for _ in keys)
+    rows = _get_conn().execute(
+        f"SELECT key, vector FROM embedding_cache WHERE key IN ({placeholders})",
+        keys,
+    ).fetchall()
+    return {row["key"]: row["vector"] for row in rows}
+
+
+@metrics.timed("sqlite")
+def put_cached_embeddings(entries: list[tuple[str, bytes]], created_at: float) -> None:
+    """Store (key, float32 vector bytes) entries."""
+    if not entries:
+        return
+    with transaction() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO embedding_cache (key, vector, created_at) VALUES (?, ?, ?)",
+            [(key, vector, created_at) for key, vector in entries],
+        )
+
+
+@metrics.timed("sqlite")
+def prune_embedding_cache(max_entries: int) -> int:
+    with transaction() as conn:
+        return conn.execute(
+            "DELETE FROM embedding_cache WHERE key IN ("
+            "SELECT key FROM embedding_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (max_entries,),
+        ).rowcount
+
+
+@metrics.timed("sqlite")
+def get_rate_bucket(provider: str) -> dict | None:
+    """A provider's shared rate-limit bucket; call inside transaction(immediate=True)."""
+    row = _get_conn().execute(
+        "SELECT requests, tokens, updated_at FROM llm_rate_buckets WHERE provider = ?",
+        (provider,),
+    ).fetchone()
+    return dict(row) if row is not None else None
+
+
+@metrics.timed("sqlite")
+def put_rate_bucket(provider: str, requests: float, tokens: float, updated_at: float) -> None:
+    with transaction() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_rate_buckets (provider, requests, tokens, updated_at) "
+            "VALUES (?, ?, ?, ?)",
+            (provider, requests, tokens, updated_at),
+        )
+
+
+@metrics.timed("sqlite")
+def add_job(
+    id: str, session_id: str, question_id: str, neighbor_ids: list[str]
+) -> None:
+    now = time.time()
+    with transaction() as conn:
+        conn.execute(
+            "INSERT INTO consistency_jobs (id, session_id, question_id, total, created_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (id, session_id, question_id, len(neighbor_ids), datetime.utcnow().isoformat()),
+        )
+        conn.executemany(
+            "INSERT INTO consistency_tasks (id, job_id, neighbor_id, available_at) VALUES (?, ?, ?, ?)",
+            [(str(uuid4()), id, neighbor_id, now) for neighbor_id in neighbor_ids],
+        )
+
+
+@metrics.timed("sqlite")
+def claim_tasks(limit: int, lease_seconds: float) -> list[dict]:
+    """
+    Atomically claim up to limit runnable tasks, all belonging to one job.
+
+    Runnable means pending, or running with an expired lease (its worker
+    died or overran). Claimed tasks are leased until now + lease_seconds,
+    have their attempt counter bumped and carry a fresh lease token; results
+    are only recorded for tasks still held under that token.
+    """
+    now = time.time()
+    lease = str(uuid4())
+    with transaction(immediate=True) as conn:
+        head = conn.execute(
+            "SELECT job_id FROM consistency_tasks "
+            "WHERE status IN ('pending', 'running') AND available_at <= ? "
+            "ORDER BY available_at LIMIT 1",
+            (now,),
+        ).fetchone()
+        if head is None:
+            return []
+        rows = conn.execute(
+            "SELECT t.id, t.neighbor_id, t.attempts, j.id AS job_id, j.session_id, j.question_id "
+            "FROM consistency_tasks t JOIN consistency_jobs j ON j.id = t.job_id "
+            "WHERE t.job_id = ? AND t.status IN ('pending', 'running') AND t.available_at <= ? "
+            "LIMIT ?",
+            (head["job_id"], now, limit),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE consistency_tasks SET status = 'running', attempts = attempts + 1, "
+            "available_at = ?, lease = ? WHERE id = ?",
+            [(now + lease_seconds, lease, row["id"]) for row in rows],
+        )
+    return [{**dict(row), "attempts": row["attempts"] + 1, "lease": lease} for row in rows]
+
+
+def _update_leased(conn: sqlite3.Connection, sql: str, lease: str, rows: list[tuple]) -> list[str]:
+    """Run sql (ending in WHERE id = ?) for each row whose task is still held under lease."""
+    held = []
+    for row in rows:
+        updated = conn.execute(
+            f"{sql} AND status = 'running' AND lease = ?", (*row, lease)
+        ).rowcount
+        if updated:
+            held.append(row[-1])
+    return held
+
+
+@metrics.timed("sqlite")
+def complete_tasks(
+    lease: str,
+    verdicts: list[tuple[str, bool | None, str, str]],
+    edges: dict[str, tuple[str, str, str, bool, str, str, str]],
+) -> list[str]:
+    """
+    Record (task_id, is_consistent, explanation, tier) verdicts and their
+    edges (keyed by task id) together. Tasks whose lease has passed to
+    another worker are left alone and get no edge; returns the ids recorded.
+    """
+    with transaction() as conn:
+        recorded = _update_leased(
+            conn,
+            "UPDATE consistency_tasks SET status = 'done', is_consistent = ?, explanation = ?, "
+            "tier = ?, last_error = NULL WHERE id = ?",
+            lease,
+            [
+                (is_consistent, explanation, tier, task_id)
+                for task_id, is_consistent, explanation, tier in verdicts
+            ],
+        )
+        add_edges([edges[task_id] for task_id in recorded if task_id in edges])
+    return recorded
+
+
+@metrics.timed("sqlite")
+def reschedule_tasks(lease: str, retries: list[tuple[str, str, float]]) -> None:
+    """Put (task_id, error, available_at) tasks still held under lease back in the queue."""
+    with transaction() as conn:
+        _update_leased(
+            conn,
+            "UPDATE consistency_tasks SET status = 'pending', last_error = ?, available_at = ? "
+            "WHERE id = ?",
+            lease,
+            [(error, available_at, task_id) for task_id, error, available_at in retries],
+        )
+
+
+@metrics.timed("sqlite")
+def fail_tasks(lease: str, task_ids: list[str], error: str) -> None:
+    with transaction() as conn:
+        _update_leased(
+            conn,
+            "UPDATE consistency_tasks SET status = 'failed', last_error = ? WHERE id = ?",
+            lease,
+            [(error, task_id) for task_id in task_ids],
+        )
+
+
+@metrics.timed("sqlite")
+def get_job(id: str) -> dict | None:
+    conn = _get_conn()
+    job = conn.execute(
+        "SELECT id, session_id, question_id, total FROM consistency_jobs WHERE id = ?",
+        (id,),
+    ).fetchone()
+    if job is None:
+        return None
+    tasks = conn.execute(
+        "SELECT t.neighbor_id, t.status, t.attempts, t.is_consistent, t.explanation, "
+        "t.tier, t.last_error, q.text, q.answer "
+        "FROM consistency_tasks t LEFT JOIN questions q ON q.id = t.neighbor_id "
+        "WHERE t.job_id = ?",
+        (id,),
+    ).fetchall()
+    return {**dict(job), "tasks": [dict(task) for task in tasks]}
+
+
+@metrics.timed("sqlite")
+def prune_jobs(created_before: str) -> int:
+    """Delete jobs created before the given ISO timestamp that have nothing left to run."""
+    with transaction() as conn:
+        finished = (
+            "SELECT id FROM consistency_jobs WHERE created_at < ? AND NOT EXISTS ("
+            "SELECT 1 FROM consistency_tasks t WHERE t.job_id = consistency_jobs.id "
+            "AND t.status IN ('pending', 'running'))"
+        )
+        conn.execute(
+            f"DELETE FROM consistency_tasks WHERE job_id IN ({finished})", (created_before,)
+        )
+        return conn.execute(
+            f"DELETE FROM consistency_jobs WHERE id IN ({finished})", (created_before,)
+        ).rowcount
+
+
+@metrics.timed("sqlite")
+def get_graph_version(session_id: str = "default") -> int:
+    row = _get_conn().execute(
+        "SELECT version FROM graph_versions WHERE session_id = ?", (session_id,)
+    ).fetchone()
+    return row["version"] if row else 0
+
+
+@metrics.timed("sqlite")
+def get_graph_changes(session_id: str, since: int) -> tuple[int, list[dict]]:
+    """Return the session's graph version and every change logged after since, oldest first."""
+    with transaction() as conn:
+        version = get_graph_version(session_id)
+        rows = conn.execute(
+            "SELECT version, kind, item_id, op, category FROM graph_changes "
+            "WHERE session_id = ? AND version > ? AND version <= ? ORDER BY version",
+            (session_id, since, version),
+        ).fetchall()
+    return version, [dict(row) for row in rows]
+
+
+@metrics.timed("sqlite")
+def prune_graph_changes(keep_versions: int) -> int:
+    """Keep only each session's last keep_versions graph changes."""
+    with transaction() as conn:
+        return conn.execute(
+            "DELETE FROM graph_changes WHERE version <= ("
+            "SELECT v.version FROM graph_versions v "
+            "WHERE v.session_id = graph_changes.session_id) - ?",
+            (keep_versions,),
+        ).rowcount
+
+
+@metrics.timed("sqlite")
+def get_session_framework(session_id: str = "default", excluding: list[str] | None = None) -> str:
+    """The framework of the session's most recently added question, ignoring excluding ids."""
+    excluding = excluding or []
+    placeholders = ",".join("?" * len(excluding))
+    row = _get_conn().execute(
+        "SELECT framework_id FROM questions WHERE session_id = ? "
+        f"AND id NOT IN ({placeholders}) ORDER BY created_at DESC LIMIT 1",
+        (session_id, *excluding),
+    ).fetchone()
+    return row["framework_id"] if row else DEFAULT_FRAMEWORK
+
+
+@metrics.timed("sqlite")
+def get_category_counts(session_id: str = "default") -> dict[str, int]:
+    rows = _get_conn().execute(
+        "SELECT category, COUNT(*) AS n FROM questions WHERE session_id = ? GROUP BY category",
+        (session_id,),
+    ).fetchall()
+    return {row["category"]: row["n"] for row in rows}
+
+
+@metrics.timed("sqlite")
+def get_category_edge_counts(session_id: str = "default") -> list[dict]:
+    """
+    Consistency edges aggregated per unordered pair of categories.
+
+    Each row has category_a <= category_b and the number of consistent and
+    contradicting edges between their questions (a == b for edges within one
+    category).
+    """
+    rows = _get_conn().execute(
+        "SELECT MIN(s.category, t.category) AS category_a, "
+        "MAX(s.category, t.category) AS category_b, "
+        "SUM(e.is_consistent) AS consistent, "
+        "SUM(NOT e.is_consistent) AS contradictions "
+        "FROM consistency_edges e "
+        "JOIN questions s ON s.id = e.source_id "
+        "JOIN questions t ON t.id = e.target_id "
+        "WHERE e.session_id = ? "
+        "GROUP BY category_a, category_b",
+        (session_id,),
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+
+@metrics.timed("sqlite")
+def get_category_edges(session_id: str, category: str) -> list[dict]:
+    """Edges with at least one endpoint in the given category."""
+    rows = _get_conn().execute(
+        "SELECT e.id, e.source_id, e.target_id, e.is_consistent, e.explanation, e.tier "
+        "FROM consistency_edges e "
+        "JOIN questions s ON s.id = e.source_id "
+        "JOIN questions t ON t.id = e.target_id "
+        "WHERE e.session_id = ? AND (s.category = ? OR t.category = ?)",
+        (session_id, category, category),
+    ).fetchall()
+    return [_row_to_edge(row) for row in rows]
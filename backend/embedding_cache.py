@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from backend import database, metrics
+from backend.config import (
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_MAX_ENTRIES,
+    EMBEDDING_CACHE_MEMORY_ENTRIES,
+)
+
+# Prune the on-disk table once every this many written vectors
+_PRUNE_EVERY = 1000
+
+_lock = threading.Lock()
+_memory: OrderedDict[str, np.ndarray] = OrderedDict()
+_hits = 0
+_misses = 0
+_writes_since_prune = 0
+
+
+def make_key(text: str, model: str) -> str:
+    """Content address of text's embedding under model. The text is not normalized."""
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+def _remember(key: str, vector: np.ndarray) -> None:
+    # Caller holds _lock
+    _memory[key] = vector
+    _memory.move_to_end(key)
+    while len(_memory) > EMBEDDING_CACHE_MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+
+def get_many(keys: list[str]) -> dict[str, np.ndarray]:
+    """Cached vectors by key, from memory first and then from disk."""
+    global _hits, _misses
+    if not EMBEDDING_CACHE_ENABLED or not keys:
+        return {}
+
+    found: dict[str, np.ndarray] = {}
+    with _lock:
+        for key in keys:
+            vector = _memory.get(key)
+            if vector is not None:
+                _memory.move_to_end(key)
+                found[key] = vector
+
+    missing = [key for key in dict.fromkeys(keys) if key not in found]
+    if missing:
+        stored = database.get_cached_embeddings(missing)
+        with _lock:
+            for key, blob in stored.items():
+                vector = np.frombuffer(blob, dtype=np.float32)
+                found[key] = vector
+                _remember(key, vector)
+
+    misses = len(set(keys)) - len(found)
+    with _lock:
+        _hits += len(found)
+        _misses += misses
+    metrics.count_cache("embedding", len(found), misses)
+    return found
+
+
+def put_many(entries: dict[str, np.ndarray]) -> None:
+    global _writes_since_prune
+    if not EMBEDDING_CACHE_ENABLED or not entries:
+        return
+    vectors = {
+        key: np.array(vector, dtype=np.float32)  # own copy, frozen below
+        for key, vector in entries.items()
+    }
+    with _lock:
+        for key, vector in vectors.items():
+            vector.setflags(write=False)
+            _remember(key, vector)
+    database.put_cached_embeddings(
+        [(key, vector.tobytes()) for key, vector in vectors.items()], time.time()
+    )
+
+    with _lock:
+        _writes_since_prune += len(vectors)
+        should_prune = _writes_since_prune >= _PRUNE_EVERY
+        if should_prune:
+            _writes_since_prune = 0
+    if should_prune:
+        database.prune_embedding_cache(EMBEDDING_CACHE_MAX_ENTRIES)
+
+
+def stats() -> dict:
+    with _lock:
+        hits, misses, size = _hits, _misses, len(_memory)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / total if total else 0.0,
+        "memory_entries": size,
+    }
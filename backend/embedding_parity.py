@@ -0,0 +1,103 @@
+"""
+Check that the ONNX embedding backend agrees with the torch one.
+
+Encodes every QUESTION_BANK and PROTOTYPES sentence with both backends and
+reports per-sentence cosine agreement, whether categorization of the question
+bank changes, and encode throughput. Exits non-zero if any cosine falls below
+EMBEDDING_PARITY_MIN_COSINE or any category differs.
+
+    python -m backend.embedding_parity
+"""
+from __future__ import annotations
+
+import sys
+import time
+
+import numpy as np
+
+from backend.categorizer import PROTOTYPES, build_matrix
+from backend.config import EMBEDDING_PARITY_MIN_COSINE, FRAMEWORKS, QUESTION_BANK
+from backend.embeddings import load_model
+
+
+def _sentences() -> list[str]:
+    sentences = [s for prompts in QUESTION_BANK.values() for s in prompts]
+    sentences += [s for prototypes in PROTOTYPES.values() for s in prototypes]
+    return list(dict.fromkeys(sentences))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _timed_encode(model, sentences: list[str]) -> tuple[np.ndarray, float]:
+    model.encode(sentences[:8])  # exclude one-off initialization from the timing
+    start = time.perf_counter()
+    vectors = model.encode(sentences)
+    return _normalize(vectors), len(sentences) / (time.perf_counter() - start)
+
+
+def _categories(model, vectors_by_sentence: dict[str, np.ndarray]) -> dict[tuple[str, str], str]:
+    """Category of every question bank prompt under its framework's principles."""
+    found = {}
+    for framework_id, prompts in QUESTION_BANK.items():
+        principles = FRAMEWORKS.get(framework_id, {}).get("principles") or list(PROTOTYPES)
+        matrix = build_matrix(tuple(principles), model)
+        for prompt in prompts:
+            found[(framework_id, prompt)] = principles[int(np.argmax(matrix @ vectors_by_sentence[prompt]))]
+    return found
+
+
+def check_parity() -> dict:
+    sentences = _sentences()
+    torch_model = load_model("torch")
+    onnx_model = load_model("onnx")
+
+    torch_vectors, torch_rate = _timed_encode(torch_model, sentences)
+    onnx_vectors, onnx_rate = _timed_encode(onnx_model, sentences)
+    cosines = np.sum(torch_vectors * onnx_vectors, axis=1)
+
+    torch_categories = _categories(torch_model, dict(zip(sentences, torch_vectors)))
+    onnx_categories = _categories(onnx_model, dict(zip(sentences, onnx_vectors)))
+    changed = [
+        {"framework_id": framework_id, "text": text,
+         "torch": torch_categories[(framework_id, text)], "onnx": category}
+        for (framework_id, text), category in onnx_categories.items()
+        if category != torch_categories[(framework_id, text)]
+    ]
+
+    worst = int(np.argmin(cosines))
+    return {
+        "sentences": len(sentences),
+        "min_cosine": float(cosines[worst]),
+        "mean_cosine": float(cosines.mean()),
+        "worst_sentence": sentences[worst],
+        "changed_categories": changed,
+        "torch_sentences_per_second": torch_rate,
+        "onnx_sentences_per_second": onnx_rate,
+        "passed": bool(cosines[worst] >= EMBEDDING_PARITY_MIN_COSINE and not changed),
+    }
+
+
+def main() -> int:
+    report = check_parity()
+    print(f"sentences:          {report['sentences']}")
+    print(f"cosine min / mean:  {report['min_cosine']:.4f} / {report['mean_cosine']:.4f}")
+    print(f"worst sentence:     {report['worst_sentence']}")
+    print(f"changed categories: {len(report['changed_categories'])}")
+    for change in report["changed_categories"]:
+        print(f"  [{change['framework_id']}] {change['text']}: {change['torch']} -> {change['onnx']}")
+    print(
+        f"throughput:         torch {report['torch_sentences_per_second']:.0f}/s, "
+        f"onnx {report['onnx_sentences_per_second']:.0f}/s"
+    )
+    if report["passed"]:
+        print("PASS")
+    else:
+        print(f"FAIL (needs min cosine >= {EMBEDDING_PARITY_MIN_COSINE} and no changed categories)")
+    return 0 if report["passed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,71 +1,383 @@
 from __future__ import annotations
 
-from sentence_transformers import SentenceTransformer
-import chromadb
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import TYPE_CHECKING
 
-from backend.config import CHROMA_PATH
+import numpy as np
+
+from backend import embedding_cache, metrics, vector_index
+from backend.config import (
+    CHROMA_PATH,
+    DEFAULT_FRAMEWORK,
+    EMBEDDING_BACKEND,
+    EMBEDDING_MODEL_NAME,
+    EMBEDDING_ONNX_FILE,
+    ENCODER_BATCHING_ENABLED,
+    ENCODER_MAX_BATCH,
+    ENCODER_MAX_WAIT_MS,
+    ENCODER_TIMEOUT_SECONDS,
+    ENCODER_THREADS,
+    VECTOR_INDEX_BACKEND,
+)
+from backend.database import get_question
+
+# sentence_transformers and chromadb take seconds to import; they are loaded
+# on first use (normally by the startup warm-up) so the server binds quickly
+if TYPE_CHECKING:
+    import chromadb
+    from sentence_transformers import SentenceTransformer
 
 _model: SentenceTransformer | None = None
+_model_name: str | None = None
 _collection: chromadb.Collection | None = None
+_encoder: _Encoder | None = None
+_model_lock = threading.Lock()
+_collection_lock = threading.Lock()
+
+
+def load_model(backend: str = EMBEDDING_BACKEND) -> SentenceTransformer:
+    """Build a fresh model for the given backend ("torch" or "onnx")."""
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        return SentenceTransformer(
+            EMBEDDING_MODEL_NAME,
+            backend="onnx",
+            model_kwargs={"file_name": EMBEDDING_ONNX_FILE},
+        )
+    if backend == "torch":
+        if ENCODER_THREADS > 0:
+            import torch
+
+            torch.set_num_threads(ENCODER_THREADS)
+        return SentenceTransformer(EMBEDDING_MODEL_NAME)
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+def set_model(model, name: str) -> None:
+    """
+    Encode with model (anything with SentenceTransformer.encode's signature)
+    instead of loading EMBEDDING_MODEL_NAME, e.g. a fake encoder in benchmarks.
+    name replaces model_id() so caches never mix its vectors with real ones.
+    """
+    global _model, _model_name
+    with _model_lock:
+        _model, _model_name = model, name
+
+
+def model_id(backend: str = EMBEDDING_BACKEND) -> str:
+    """Name for artifacts derived from the model's vectors, e.g. prototype caches."""
+    if _model_name is not None:
+        return _model_name
+    if backend == "onnx":
+        return f"{EMBEDDING_MODEL_NAME}-onnx-{Path(EMBEDDING_ONNX_FILE).stem}"
+    return EMBEDDING_MODEL_NAME
 
 
 def get_model() -> SentenceTransformer:
     global _model
     if _model is None:
-        _model = SentenceTransformer("all-MiniLM-L6-v2")
+        with _model_lock:
+            if _model is None:
+                _model = load_model()
     return _model
 
 
+class _Encoder:
+    """
+    Runs every model call on one thread, batching calls that arrive together.
+
+    Requests from concurrent callers are merged into one encode of up to
+    ENCODER_MAX_BATCH texts (a single larger request runs on its own), so
+    the model sees matrix-sized batches and never competes with itself for
+    cores. Each caller gets back the rows for its own texts.
+    """
+
+    def __init__(self):
+        self._requests: queue.SimpleQueue[tuple[list[str], Future]] = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="encoder", daemon=True)
+        self._thread.start()
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        future: Future = Future()
+        self._requests.put((texts, future))
+        return future.result(timeout=ENCODER_TIMEOUT_SECONDS)
+
+    def _collect(self, carried: tuple[list[str], Future] | None) -> tuple[list, tuple | None]:
+        """One batch of requests, and the request that did not fit in it."""
+        batch = [carried or self._requests.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + ENCODER_MAX_WAIT_MS / 1000
+        while size < ENCODER_MAX_BATCH:
+            try:
+                request = self._requests.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                break
+            if size + len(request[0]) > ENCODER_MAX_BATCH:
+                return batch, request
+            batch.append(request)
+            size += len(request[0])
+        return batch, None
+
+    def _run(self) -> None:
+        carried = None
+        while True:
+            batch, carried = self._collect(carried)
+            # Whatever goes wrong, every caller gets an answer and the thread lives on
+            try:
+                self._encode_batch(batch)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _encode_batch(self, batch: list[tuple[list[str], Future]]) -> None:
+        texts = list(dict.fromkeys(
+            text for request_texts, _ in batch for text in request_texts
+        ))
+        vectors = get_model().encode(texts)
+        if len(vectors) != len(texts):
+            raise ValueError(f"Model returned {len(vectors)} vectors for {len(texts)} texts")
+        rows = dict(zip(texts, vectors))
+        metrics.inc("mirror_encoder_batches_total")
+        metrics.inc("mirror_encoder_texts_total", len(texts))
+        for request_texts, future in batch:
+            future.set_result(np.vstack([rows[text] for text in request_texts]))
+
+
+def _get_encoder() -> _Encoder:
+    global _encoder
+    if _encoder is None:
+        with _model_lock:
+            if _encoder is None:
+                _encoder = _Encoder()
+    return _encoder
+
+
 def get_collection() -> chromadb.Collection:
     global _collection
     if _collection is None:
-        client = chromadb.PersistentClient(path=CHROMA_PATH)
-        _collection = client.get_or_create_collection(
-            name="questions",
-            metadata={"hnsw:space": "cosine"},
-        )
+        with _collection_lock:
+            if _collection is None:
+                import chromadb
+
+                client = chromadb.PersistentClient(path=CHROMA_PATH)
+                _collection = client.get_or_create_collection(
+                    name="questions",
+                    metadata={"hnsw:space": "cosine"},
+                )
     return _collection
 
 
-def add_embedding(id: str, text: str, category: str) -> None:
-    model = get_model()
-    embedding = model.encode(text).tolist()
+def warm_up() -> None:
+    """Load the model (and run one encode) and open the vector index."""
+    get_model().encode("warm-up")
+    if VECTOR_INDEX_BACKEND != "numpy":
+        get_collection()
+
+
+def encode(text: str) -> np.ndarray:
+    """Embed a single statement. Compute once per request and pass it along."""
+    return encode_many([text])[0]
+
+
+def encode_many(texts: list[str]) -> np.ndarray:
+    """
+    Embed several statements; one row per text.
+
+    Vectors come from the content-addressed embedding cache when possible, and
+    only the texts never seen before go to the model, in one batched call.
+    """
+    if not texts:
+        return np.empty((0, 0), dtype=np.float32)
+    model = model_id()
+    keys = [embedding_cache.make_key(text, model) for text in texts]
+    cached = embedding_cache.get_many(keys)
+
+    missing = list(dict.fromkeys(
+        text for text, key in zip(texts, keys) if key not in cached
+    ))
+    if missing:
+        with metrics.stage("encode.model"):
+            if ENCODER_BATCHING_ENABLED:
+                vectors = _get_encoder().encode(missing)
+            else:
+                vectors = get_model().encode(missing)
+        fresh = {
+            embedding_cache.make_key(text, model): vector
+            for text, vector in zip(missing, vectors)
+        }
+        embedding_cache.put_many(fresh)
+        cached.update(fresh)
+
+    return np.vstack([cached[key] for key in keys]).astype(np.float32, copy=False)
+
+
+def add_embedding(
+    id: str, text: str, category: str,
+    session_id: str = "default", framework_id: str = DEFAULT_FRAMEWORK,
+    embedding: np.ndarray | None = None,
+) -> None:
+    if embedding is None:
+        embedding = encode(text)
+    add_embeddings([id], [text], [category], embedding[np.newaxis, :], session_id, framework_id)
+
+
+@metrics.timed("vector")
+def add_embeddings(
+    ids: list[str], texts: list[str], categories: list[str], vectors: np.ndarray,
+    session_id: str = "default", framework_id: str = DEFAULT_FRAMEWORK,
+) -> None:
+    """Store several embeddings of one session with a single index write."""
+    if VECTOR_INDEX_BACKEND == "numpy":
+        vector_index.add(session_id, ids, texts, categories, framework_id, vectors)
+        return
+
     collection = get_collection()
     collection.add(
-        ids=[id],
-        embeddings=[embedding],
-        documents=[text],
-        metadatas=[{"category": category}],
+        ids=ids,
+        embeddings=vectors.tolist(),
+        documents=texts,
+        metadatas=[
+            {
+                "category": category,
+                "session_id": session_id,
+                "framework_id": framework_id,
+            }
+            for category in categories
+        ],
     )
 
 
-def search_similar(text: str, n: int = 5) -> list[tuple[str, str, str, float]]:
+def _build_where(session_id: str | None, category: str | None) -> dict | None:
+    clauses = []
+    if session_id is not None:
+        clauses.append({"session_id": session_id})
+    if category is not None:
+        clauses.append({"category": category})
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def search_similar(
+    text: str,
+    n: int = 5,
+    session_id: str | None = None,
+    category: str | None = None,
+    max_distance: float | None = None,
+    embedding: np.ndarray | None = None,
+) -> list[tuple[str, str, str, float]]:
+    """
+    Return up to n (id, document, category, distance) tuples nearest to text.
+
+    session_id and category are pushed into the Chroma where filter, so the
+    top n are taken from that session/category only rather than from the
+    whole corpus. Hits farther than max_distance are dropped. Pass a
+    precomputed embedding to skip re-encoding text.
+    """
+    if embedding is None:
+        embedding = encode(text)
+    return search_similar_many(
+        embedding[np.newaxis, :], n, session_id, category, max_distance
+    )[0]
+
+
+@metrics.timed("vector")
+def search_similar_many(
+    vectors: np.ndarray,
+    n: int = 5,
+    session_id: str | None = None,
+    category: str | None = None,
+    max_distance: float | None = None,
+) -> list[list[tuple[str, str, str, float]]]:
+    """Run search_similar for every row of vectors in a single index query."""
+    if VECTOR_INDEX_BACKEND == "numpy":
+        return vector_index.search(vectors, n, session_id, category, max_distance)
+
     collection = get_collection()
     if collection.count() == 0:
-        return []
-
-    model = get_model()
-    embedding = model.encode(text).tolist()
+        return [[] for _ in range(len(vectors))]
 
     actual_n = min(n, collection.count())
     results = collection.query(
-        query_embeddings=[embedding],
+        query_embeddings=vectors.tolist(),
         n_results=actual_n,
+        where=_build_where(session_id, category),
         include=["documents", "metadatas", "distances"],
     )
 
-    similar = []
-    if results["ids"] and results["ids"][0]:
-        for i, id in enumerate(results["ids"][0]):
-            doc = results["documents"][0][i]
-            meta = results["metadatas"][0][i]
-            dist = results["distances"][0][i]
-            similar.append((id, doc, meta["category"], dist))
+    all_similar = []
+    for q in range(len(vectors)):
+        similar = []
+        if results["ids"] and q < len(results["ids"]):
+            for i, id in enumerate(results["ids"][q]):
+                doc = results["documents"][q][i]
+                meta = results["metadatas"][q][i]
+                dist = results["distances"][q][i]
+                if max_distance is not None and dist > max_distance:
+                    continue
+                similar.append((id, doc, meta["category"], dist))
+        all_similar.append(similar)
+
+    return all_similar
+
+
+def backfill_session_metadata(page_size: int = 500) -> int:
+    """
+    Add session_id/framework_id metadata to embeddings stored before it existed.
+
+    Without it, session-filtered searches can never return those statements.
+    Runs once per Chroma directory; returns the number of embeddings updated.
+    The numpy index always stores session metadata, so there it is a no-op.
+    """
+    if VECTOR_INDEX_BACKEND == "numpy":
+        return 0
+
+    marker = Path(CHROMA_PATH) / ".session_metadata_backfilled"
+    if marker.exists():
+        return 0
+
+    collection = get_collection()
+    updated = 0
+    offset = 0
+    while True:
+        page = collection.get(limit=page_size, offset=offset, include=["metadatas"])
+        if not page["ids"]:
+            break
+        ids, metadatas = [], []
+        for id, meta in zip(page["ids"], page["metadatas"]):
+            if meta and "session_id" in meta:
+                continue
+            question = get_question(id)
+            if question is None:
+                continue
+            ids.append(id)
+            metadatas.append({
+                **(meta or {}),
+                "session_id": question.session_id,
+                "framework_id": (meta or {}).get("framework_id", DEFAULT_FRAMEWORK),
+            })
+        if ids:
+            collection.update(ids=ids, metadatas=metadatas)
+            updated += len(ids)
+        offset += page_size
+    marker.touch()
+    return updated
 
-    return similar
 
+@metrics.timed("vector")
+def delete_embedding(id: str, session_id: str = "default") -> None:
+    if VECTOR_INDEX_BACKEND == "numpy":
+        vector_index.delete(session_id, id)
+        return
 
-def delete_embedding(id: str) -> None:
     collection = get_collection()
     try:
         collection.delete(ids=[id])
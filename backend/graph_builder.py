@@ -1,87 +1,264 @@
 import math
 
-from backend.config import CATEGORIES
-from backend.database import get_edges, get_questions
-from backend.models import GraphData, GraphEdge, GraphNode
+from backend import metrics
+from backend.config import GRAPH_CHANGELOG_MAX_VERSIONS, get_categories
+from backend.database import (
+    get_category_counts,
+    get_category_edge_counts,
+    get_category_edges,
+    get_edges,
+    get_edges_by_ids,
+    get_graph_changes,
+    get_graph_version,
+    get_questions,
+    get_questions_in_categories,
+    get_session_framework,
+)
+from backend.models import GraphData, GraphDelta, GraphEdge, GraphNode, QuestionResponse
 
+CENTER_X, CENTER_Y = 900, 900
+HUB_RADIUS = 700
+QUESTION_RADIUS = 180
+# Minimum arc length between neighbouring questions; big categories get a
+# wider circle instead of overlapping nodes
+QUESTION_SPACING = 60
 
-def build_graph(session_id: str = "default") -> GraphData:
-    questions = get_questions(session_id)
-    edges = get_edges(session_id)
 
-    nodes: list[GraphNode] = []
-    graph_edges: list[GraphEdge] = []
+def _hub_id(category: str) -> str:
+    return f"cat-{category.lower().replace(' ', '-')}"
 
-    center_x, center_y = 900, 900
-    hub_radius = 700
-    question_radius = 180
 
-    category_list = list(CATEGORIES.keys())
-    category_positions: dict[str, tuple[float, float]] = {}
-
-    # Create category hub nodes arranged in a circle
+def _category_positions(categories: dict[str, str]) -> dict[str, tuple[float, float]]:
+    category_list = list(categories.keys())
+    positions: dict[str, tuple[float, float]] = {}
+    # Category hubs arranged in a circle
     for i, category in enumerate(category_list):
         angle = (2 * math.pi * i) / len(category_list) - math.pi / 2
-        x = center_x + hub_radius * math.cos(angle)
-        y = center_y + hub_radius * math.sin(angle)
-        category_positions[category] = (x, y)
+        positions[category] = (
+            CENTER_X + HUB_RADIUS * math.cos(angle),
+            CENTER_Y + HUB_RADIUS * math.sin(angle),
+        )
+    return positions
+
 
+def _question_nodes(
+    hub: tuple[float, float], cat_questions: list[QuestionResponse]
+) -> list[GraphNode]:
+    """Nodes for one category's questions, arranged around its hub."""
+    hub_x, hub_y = hub
+    radius = max(QUESTION_RADIUS, len(cat_questions) * QUESTION_SPACING / (2 * math.pi))
+    nodes = []
+    for j, q in enumerate(cat_questions):
+        angle = (2 * math.pi * j) / len(cat_questions) - math.pi / 2
+        x = hub_x + radius * math.cos(angle)
+        y = hub_y + radius * math.sin(angle)
+
+        label = q.text[:50] + "..." if len(q.text) > 50 else q.text
         nodes.append(
             GraphNode(
-                id=f"cat-{category.lower().replace(' ', '-')}",
-                type="category",
+                id=q.id,
+                type="question",
                 position={"x": x, "y": y},
-                data={"label": category, "color": CATEGORIES[category]},
+                data={
+                    "label": label,
+                    "full_text": q.text,
+                    "answer": q.answer,
+                    "category": q.category,
+                },
             )
         )
+    return nodes
+
+
+def _graph_edge(edge: dict) -> GraphEdge:
+    is_consistent = edge["is_consistent"]
+    color = "#22c55e" if is_consistent else "#ef4444"
+    return GraphEdge(
+        id=edge["id"],
+        source=edge["source_id"],
+        target=edge["target_id"],
+        style={"stroke": color, "strokeWidth": 2},
+        data={
+            "is_consistent": is_consistent,
+            "explanation": edge["explanation"],
+            "tier": edge["tier"],
+        },
+        type="consistency",
+    )
+
 
-    # Group questions by category
-    questions_by_category: dict[str, list] = {cat: [] for cat in category_list}
+def _group_by_category(
+    categories: dict[str, str], questions: list[QuestionResponse]
+) -> dict[str, list[QuestionResponse]]:
+    questions_by_category: dict[str, list[QuestionResponse]] = {cat: [] for cat in categories}
     for q in questions:
         if q.category in questions_by_category:
             questions_by_category[q.category].append(q)
+    return questions_by_category
 
-    # Create question nodes arranged around their category hub
-    for category, cat_questions in questions_by_category.items():
-        if not cat_questions:
-            continue
-        hub_x, hub_y = category_positions[category]
-        for j, q in enumerate(cat_questions):
-            angle = (2 * math.pi * j) / len(cat_questions) - math.pi / 2
-            x = hub_x + question_radius * math.cos(angle)
-            y = hub_y + question_radius * math.sin(angle)
-
-            label = q.text[:50] + "..." if len(q.text) > 50 else q.text
-            nodes.append(
-                GraphNode(
-                    id=q.id,
-                    type="question",
-                    position={"x": x, "y": y},
-                    data={
-                        "label": label,
-                        "full_text": q.text,
-                        "answer": q.answer,
-                        "category": q.category,
-                    },
-                )
+
+def session_categories(session_id: str) -> dict[str, str]:
+    """Category -> color for the framework the session is answering."""
+    return get_categories(get_session_framework(session_id))
+
+
+@metrics.timed("graph")
+def build_graph(session_id: str = "default") -> GraphData:
+    # Read the version first: a change racing with the reads below is then
+    # re-sent by the next delta instead of being missed
+    version = get_graph_version(session_id)
+    categories = session_categories(session_id)
+    questions = get_questions(session_id)
+    edges = get_edges(session_id)
+
+    nodes: list[GraphNode] = []
+    category_positions = _category_positions(categories)
+
+    for category, (x, y) in category_positions.items():
+        nodes.append(
+            GraphNode(
+                id=_hub_id(category),
+                type="category",
+                position={"x": x, "y": y},
+                data={"label": category, "color": categories[category]},
             )
+        )
+
+    for category, cat_questions in _group_by_category(categories, questions).items():
+        if cat_questions:
+            nodes.extend(_question_nodes(category_positions[category], cat_questions))
+
+    graph_edges = [_graph_edge(edge) for edge in edges]
+    return GraphData(nodes=nodes, edges=graph_edges, version=version)
+
+
+@metrics.timed("graph")
+def build_graph_delta(session_id: str, since: int) -> GraphDelta | GraphData:
+    """
+    Changes to the session's graph after version since.
+
+    Questions are spread evenly around their category hub, so adding or
+    removing one also moves its siblings; those are re-sent along with the
+    added nodes. Falls back to the full graph when since is unknown or older
+    than the retained change log.
+    """
+    version = get_graph_version(session_id)
+    if since > version or since < version - GRAPH_CHANGELOG_MAX_VERSIONS:
+        return build_graph(session_id)
+
+    version, changes = get_graph_changes(session_id, since)
+    # The last change to each item wins
+    latest: dict[tuple[str, str], str] = {}
+    touched_categories: set[str] = set()
+    for change in changes:
+        latest[(change["kind"], change["item_id"])] = change["op"]
+        if change["kind"] == "node":
+            touched_categories.add(change["category"])
+
+    removed_nodes = [id for (kind, id), op in latest.items() if kind == "node" and op == "remove"]
+    removed_edges = [id for (kind, id), op in latest.items() if kind == "edge" and op == "remove"]
+    added_edges = [id for (kind, id), op in latest.items() if kind == "edge" and op == "add"]
+    added_nodes = [id for (kind, id), op in latest.items() if kind == "node" and op == "add"]
+
+    # The hubs follow the latest question's framework. Deltas never carry
+    # hubs, so re-send everything if that framework moved; a removed question
+    # may have been the one that set it, which the database can no longer tell
+    if added_nodes or removed_nodes:
+        framework = get_session_framework(session_id)
+        if removed_nodes or get_session_framework(session_id, added_nodes) != framework:
+            return build_graph(session_id)
+
+    nodes: list[GraphNode] = []
+    categories = session_categories(session_id)
+    category_positions = _category_positions(categories)
+    siblings = get_questions_in_categories(session_id, sorted(touched_categories))
+    for category, cat_questions in _group_by_category(categories, siblings).items():
+        if cat_questions:
+            nodes.extend(_question_nodes(category_positions[category], cat_questions))
+
+    return GraphDelta(
+        version=version,
+        since=since,
+        nodes=nodes,
+        edges=[_graph_edge(edge) for edge in get_edges_by_ids(added_edges)],
+        removed_nodes=removed_nodes,
+        removed_edges=removed_edges,
+    )
+
+
+@metrics.timed("graph")
+def build_summary_graph(session_id: str = "default") -> GraphData:
+    """
+    Level-of-detail view: one node per category hub and one aggregate edge per
+    pair of categories with consistency edges between their questions.
 
-    # Create edges from consistency_edges
-    for edge in edges:
-        is_consistent = edge["is_consistent"]
-        color = "#22c55e" if is_consistent else "#ef4444"
-        graph_edges.append(
+    Counts come from GROUP BY queries; edges within a category are reported
+    on its hub instead of as a self-loop.
+    """
+    version = get_graph_version(session_id)
+    categories = session_categories(session_id)
+    question_counts = get_category_counts(session_id)
+    edge_counts = get_category_edge_counts(session_id)
+
+    internal = {
+        row["category_a"]: row for row in edge_counts
+        if row["category_a"] == row["category_b"]
+    }
+    nodes = []
+    for category, (x, y) in _category_positions(categories).items():
+        own = internal.get(category, {})
+        nodes.append(
+            GraphNode(
+                id=_hub_id(category),
+                type="category",
+                position={"x": x, "y": y},
+                data={
+                    "label": category,
+                    "color": categories[category],
+                    "question_count": question_counts.get(category, 0),
+                    "consistent": own.get("consistent", 0),
+                    "contradictions": own.get("contradictions", 0),
+                },
+            )
+        )
+
+    edges = []
+    for row in edge_counts:
+        a, b = row["category_a"], row["category_b"]
+        if a == b or a not in categories or b not in categories:
+            continue
+        total = row["consistent"] + row["contradictions"]
+        color = "#ef4444" if row["contradictions"] > row["consistent"] else "#22c55e"
+        edges.append(
             GraphEdge(
-                id=edge["id"],
-                source=edge["source_id"],
-                target=edge["target_id"],
-                style={"stroke": color, "strokeWidth": 2},
+                id=f"agg-{_hub_id(a)}-{_hub_id(b)}",
+                source=_hub_id(a),
+                target=_hub_id(b),
+                style={"stroke": color, "strokeWidth": min(12, 1 + math.log2(1 + total) * 2)},
                 data={
-                    "is_consistent": is_consistent,
-                    "explanation": edge["explanation"],
+                    "consistent": row["consistent"],
+                    "contradictions": row["contradictions"],
                 },
-                type="consistency",
+                type="aggregate",
             )
         )
 
-    return GraphData(nodes=nodes, edges=graph_edges)
+    return GraphData(nodes=nodes, edges=edges, version=version)
+
+
+@metrics.timed("graph")
+def build_category_graph(session_id: str, category: str) -> GraphData | None:
+    """
+    Expand one category hub: its question nodes and every edge touching them.
+
+    Returns None if the category is not part of the session's framework.
+    """
+    version = get_graph_version(session_id)
+    categories = session_categories(session_id)
+    if category not in categories:
+        return None
+    questions = get_questions_in_categories(session_id, [category])
+    hub = _category_positions(categories)[category]
+    nodes = _question_nodes(hub, questions) if questions else []
+    edges = [_graph_edge(edge) for edge in get_category_edges(session_id, category)]
+    return GraphData(nodes=nodes, edges=edges, version=version)
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from backend import consistency, database, llm_scheduler
+from backend.config import (
+    GRAPH_CHANGELOG_MAX_VERSIONS,
+    JOB_LEASE_SECONDS,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL,
+    JOB_RETENTION_SECONDS,
+    JOB_RETRY_BASE_SECONDS,
+    JOB_WORKERS,
+    LLM_BATCH_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+# How often (seconds) one of the workers deletes old finished jobs and graph changes
+_PRUNE_INTERVAL = 3600
+
+# Share of the lease the LLM calls may use, leaving the rest to record the
+# verdicts before another worker can claim the tasks
+_LEASE_BUDGET = 0.75
+
+_threads: list[threading.Thread] = []
+_stop = threading.Event()
+_wakeup = threading.Event()
+_prune_lock = threading.Lock()
+_last_prune = 0.0
+
+
+def enqueue(session_id: str, question_id: str, neighbor_ids: list[str]) -> str:
+    """
+    Queue consistency checks of question_id against each neighbor; returns the job id.
+
+    Joins the caller's open database.transaction(), if any. Call notify() once
+    it has committed so idle workers pick the job up immediately.
+    """
+    job_id = str(uuid4())
+    database.add_job(job_id, session_id, question_id, neighbor_ids)
+    return job_id
+
+
+def notify() -> None:
+    _wakeup.set()
+
+
+def job_status(job: dict) -> str:
+    tasks = job["tasks"]
+    if all(task["status"] in ("done", "failed") for task in tasks):
+        return "done"
+    if all(task["status"] == "pending" and task["attempts"] == 0 for task in tasks):
+        return "pending"
+    return "running"
+
+
+def _retry_delay(attempts: int) -> float:
+    # Exponential backoff with jitter so retries from many jobs do not align
+    return JOB_RETRY_BASE_SECONDS * (2 ** (attempts - 1)) * random.uniform(1.0, 1.5)
+
+
+def _run_tasks(tasks: list[dict]) -> None:
+    deadline_at = time.monotonic() + JOB_LEASE_SECONDS * _LEASE_BUDGET
+    lease = tasks[0]["lease"]
+    question_id = tasks[0]["question_id"]
+    session_id = tasks[0]["session_id"]
+    stored = database.get_questions_by_ids(
+        [question_id] + [task["neighbor_id"] for task in tasks]
+    )
+    question = stored.get(question_id)
+
+    # Statements deleted after the job was queued cannot be compared any more
+    gone = [
+        task for task in tasks
+        if question is None or task["neighbor_id"] not in stored
+    ]
+    if gone:
+        database.fail_tasks(lease, [task["id"] for task in gone], "Statement was deleted")
+    tasks = [task for task in tasks if task not in gone]
+    if not tasks:
+        return
+
+    neighbors = [stored[task["neighbor_id"]] for task in tasks]
+    try:
+        with llm_scheduler.priority(llm_scheduler.BACKGROUND):
+            verdicts = consistency.judge_neighbors(
+                question.text, question.answer, neighbors, deadline_at
+            )
+    except Exception as e:
+        error = consistency.error_reason(e)
+        now = time.time()
+        retries = [
+            (task["id"], error, now + _retry_delay(task["attempts"]))
+            for task in tasks
+            if task["attempts"] < JOB_MAX_ATTEMPTS
+        ]
+        exhausted = [task["id"] for task in tasks if task["attempts"] >= JOB_MAX_ATTEMPTS]
+        if retries:
+            database.reschedule_tasks(lease, retries)
+        if exhausted:
+            database.fail_tasks(lease, exhausted, error)
+        return
+
+    recorded = database.complete_tasks(
+        lease,
+        [
+            (
+                task["id"],
+                verdicts[task["neighbor_id"]]["is_consistent"],
+                verdicts[task["neighbor_id"]]["explanation"],
+                verdicts[task["neighbor_id"]].get("tier", "llm"),
+            )
+            for task in tasks
+        ],
+        {
+            task["id"]: (
+                str(uuid4()), question_id, task["neighbor_id"],
+                verdicts[task["neighbor_id"]]["is_consistent"],
+                verdicts[task["neighbor_id"]]["explanation"],
+                session_id,
+                verdicts[task["neighbor_id"]].get("tier", "llm"),
+            )
+            for task in tasks
+            # Unknown verdicts are reported on the job but not stored as edges
+            if verdicts[task["neighbor_id"]]["is_consistent"] is not None
+        },
+    )
+    if len(recorded) < len(tasks):
+        logger.warning(
+            "Lease on %d consistency task(s) expired before their verdicts were recorded",
+            len(tasks) - len(recorded),
+        )
+
+
+def _maybe_prune() -> None:
+    global _last_prune
+    if not _prune_lock.acquire(blocking=False):
+        return
+    try:
+        if time.time() - _last_prune < _PRUNE_INTERVAL:
+            return
+        _last_prune = time.time()
+        cutoff = datetime.utcnow() - timedelta(seconds=JOB_RETENTION_SECONDS)
+        database.prune_jobs(cutoff.isoformat())
+        database.prune_graph_changes(GRAPH_CHANGELOG_MAX_VERSIONS)
+    finally:
+        _prune_lock.release()
+
+
+def _worker() -> None:
+    while not _stop.is_set():
+        try:
+            _maybe_prune()
+            tasks = database.claim_tasks(LLM_BATCH_SIZE, JOB_LEASE_SECONDS)
+            if tasks:
+                _run_tasks(tasks)
+                continue
+        except Exception:
+            logger.exception("Consistency job worker failed")
+        _wakeup.wait(JOB_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_workers(count: int = JOB_WORKERS) -> None:
+    if _threads:
+        return
+    _stop.clear()
+    for i in range(count):
+        thread = threading.Thread(target=_worker, name=f"consistency-job-{i}", daemon=True)
+        thread.start()
+        _threads.append(thread)
+
+
+def stop_workers(timeout: float = 5.0) -> None:
+    _stop.set()
+    _wakeup.set()
+    for thread in _threads:
+        thread.join(timeout)
+    _threads.clear()
@@ -0,0 +1,243 @@
+"""
+Routes one LLM request across the configured providers under a deadline.
+
+The first provider whose circuit is closed gets the call. If it is still
+running after that provider's recent p95 latency, the same request is hedged
+on the next provider and whichever answers first wins; if it fails, the next
+provider is tried at once. Every call is bounded by the caller's deadline and
+LLM_REQUEST_TIMEOUT. A provider that fails LLM_BREAKER_FAILURES times in a
+row is skipped for LLM_BREAKER_COOLDOWN_SECONDS, then let through for one
+probe call that closes the circuit again on success.
+
+Each call first waits for its provider's rate-limit budget (llm_scheduler);
+that wait is neither latency nor a failure as far as hedging and the breaker
+are concerned. Calls that lose a hedge or outlive the deadline are not
+interrupted; they finish in the background and still count towards latency
+and the breaker.
+"""
+from __future__ import annotations
+
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from backend import llm_scheduler, metrics
+from backend.config import (
+    LLM_BREAKER_COOLDOWN_SECONDS,
+    LLM_BREAKER_FAILURES,
+    LLM_HEDGE_DEFAULT_SECONDS,
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_MIN_SECONDS,
+    LLM_LATENCY_WINDOW,
+    LLM_MAX_CONCURRENCY,
+    LLM_REQUEST_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+# Successful calls needed before a provider's own p95 replaces the default hedge delay
+_MIN_LATENCY_SAMPLES = 20
+
+# A call gets the seconds it may take and returns the model's text
+Call = Callable[[float], str]
+
+
+class ProviderError(Exception):
+    """No provider produced an answer before the deadline."""
+
+
+def _describe(error: Exception) -> str:
+    """The HTTP status or error type; exception text may quote URLs, keys or payloads."""
+    if isinstance(error, llm_scheduler.QuotaTimeout):
+        return "rate limited"
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return f"HTTP {status}" if status is not None else type(error).__name__
+
+
+class _Provider:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: deque[float] = deque(maxlen=LLM_LATENCY_WINDOW)
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.probing = False
+
+    def allow(self) -> bool:
+        """Whether a call may go to this provider now (claims the probe if half-open)."""
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.probing or time.monotonic() - self.opened_at < LLM_BREAKER_COOLDOWN_SECONDS:
+                return False
+            self.probing = True
+            return True
+
+    def hedge_delay(self) -> float:
+        with self.lock:
+            if len(self.latencies) < _MIN_LATENCY_SAMPLES:
+                return LLM_HEDGE_DEFAULT_SECONDS
+            ordered = sorted(self.latencies)
+        p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+        return max(LLM_HEDGE_MIN_SECONDS, p95)
+
+    def succeeded(self, seconds: float) -> None:
+        with self.lock:
+            self.latencies.append(seconds)
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def skipped(self) -> None:
+        """The call never reached the provider; give up a claimed probe."""
+        with self.lock:
+            self.probing = False
+
+    def failed(self, name: str) -> None:
+        with self.lock:
+            self.failures += 1
+            reopen = self.probing
+            self.probing = False
+            if reopen or (self.opened_at is None and self.failures >= LLM_BREAKER_FAILURES):
+                self.opened_at = time.monotonic()
+                opened = True
+            else:
+                opened = False
+        if opened:
+            metrics.inc("mirror_llm_breaker_opens_total", provider=name)
+
+    def state(self) -> dict:
+        with self.lock:
+            if self.opened_at is None:
+                circuit = "closed"
+            elif self.probing or time.monotonic() - self.opened_at >= LLM_BREAKER_COOLDOWN_SECONDS:
+                circuit = "half_open"
+            else:
+                circuit = "open"
+            return {"circuit": circuit, "consecutive_failures": self.failures}
+
+
+_lock = threading.Lock()
+_providers: dict[str, _Provider] = {}
+_executor: ThreadPoolExecutor | None = None
+
+
+def _get_provider(name: str) -> _Provider:
+    with _lock:
+        provider = _providers.get(name)
+        if provider is None:
+            provider = _providers[name] = _Provider()
+        return provider
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                # Room for every concurrent check plus its hedge
+                _executor = ThreadPoolExecutor(
+                    max_workers=2 * LLM_MAX_CONCURRENCY, thread_name_prefix="llm-call"
+                )
+    return _executor
+
+
+def _attempt(name: str, call: Call, tokens: int, timeout: float) -> str:
+    provider = _get_provider(name)
+    start = time.monotonic()
+    try:
+        llm_scheduler.acquire(name, tokens, timeout)
+    except llm_scheduler.QuotaTimeout:
+        provider.skipped()
+        raise
+    sent = time.monotonic()
+    remaining = timeout - (sent - start)
+    if remaining <= 0:
+        # The budget came too late to send anything; not the provider's fault
+        provider.skipped()
+        raise llm_scheduler.QuotaTimeout(f"{name}: no time left after waiting for rate limit")
+    try:
+        text = call(remaining)
+    except Exception:
+        provider.failed(name)
+        raise
+    provider.succeeded(time.monotonic() - sent)
+    return text
+
+
+def route(
+    calls: list[tuple[str, Call, int]], deadline_at: float | None = None
+) -> tuple[str, str]:
+    """
+    Run one request on the first available provider, hedging and failing over
+    to the others in order. Each call is (provider name, call, tokens to
+    reserve against the provider's rate limit); deadline_at is a
+    time.monotonic() timestamp.
+
+    Returns (provider name, text); raises ProviderError when every provider
+    failed, had its circuit open, or ran out of time.
+    """
+    start = time.monotonic()
+    end = start + LLM_REQUEST_TIMEOUT
+    if deadline_at is not None:
+        end = min(end, deadline_at)
+    candidates = list(calls)
+    pending: dict[Future, str] = {}
+    errors: list[str] = []
+
+    def launch() -> str | None:
+        while candidates:
+            name, call, tokens = candidates.pop(0)
+            if not _get_provider(name).allow():
+                errors.append(f"{name}: circuit open")
+                continue
+            # Carry the caller's scheduling priority into the worker thread
+            future = _get_executor().submit(
+                contextvars.copy_context().run,
+                _attempt, name, call, tokens, end - time.monotonic(),
+            )
+            pending[future] = name
+            return name
+        return None
+
+    launch()
+    hedge_at = start + min(
+        (_get_provider(name).hedge_delay() for name in pending.values()), default=0.0
+    )
+    while pending:
+        now = time.monotonic()
+        if now >= end:
+            errors.append("deadline exceeded")
+            break
+        timeout = end - now
+        if candidates and LLM_HEDGE_ENABLED:
+            timeout = min(timeout, max(0.0, hedge_at - now))
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            name = pending.pop(future)
+            try:
+                return name, future.result()
+            except Exception as e:
+                logger.warning("%s call failed", name, exc_info=e)
+                errors.append(f"{name}: {_describe(e)}")
+        if not candidates:
+            continue
+        if not pending:
+            launch()
+        elif LLM_HEDGE_ENABLED and time.monotonic() >= hedge_at:
+            hedged = launch()
+            if hedged is not None:
+                metrics.inc("mirror_llm_hedges_total", provider=hedged)
+    raise ProviderError("; ".join(errors) or "no provider configured")
+
+
+def status() -> dict[str, dict]:
+    """Circuit state of every provider called so far."""
+    with _lock:
+        providers = dict(_providers)
+    return {name: provider.state() for name, provider in providers.items()}
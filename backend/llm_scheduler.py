@@ -0,0 +1,216 @@
+"""
+Keeps LLM calls inside each provider's rate limits across all worker processes.
+
+Every provider has a token bucket for requests and one for tokens, stored in
+the llm_rate_buckets table and updated under BEGIN IMMEDIATE, so uvicorn
+workers sharing the database share one quota. A bucket holds at most
+LLM_RATE_BURST_FRACTION of a minute's limit and refills at the rest of it, so
+no sliding minute ever sees more than the limit; within that, calls go out as
+fast as the quota allows.
+
+Calls wait in a per-process queue, interactive before background and first
+come first served within a priority; only the head of the queue draws from
+the bucket. Background calls also leave LLM_INTERACTIVE_RESERVE of each
+bucket untouched, which keeps room for interactive calls from other
+processes. A call that cannot get budget before its timeout raises
+QuotaTimeout without being sent.
+"""
+from __future__ import annotations
+
+import bisect
+import itertools
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from backend import database, metrics
+from backend.config import (
+    LLM_INTERACTIVE_RESERVE,
+    LLM_RATE_BURST_FRACTION,
+    LLM_RATE_LIMITS,
+    LLM_SCHEDULER_ENABLED,
+)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+_RANK = {INTERACTIVE: 0, BACKGROUND: 1}
+
+_priority: ContextVar[str] = ContextVar("llm_priority", default=INTERACTIVE)
+
+
+class QuotaTimeout(Exception):
+    """The provider's rate limit leaves no room for the call before its timeout."""
+
+
+class _Queue:
+    def __init__(self):
+        self.cond = threading.Condition()
+        # (rank, arrival) of every waiting call, head first
+        self.waiting: list[tuple[int, int]] = []
+
+
+_lock = threading.Lock()
+_queues: dict[str, _Queue] = {}
+_arrivals = itertools.count()
+
+
+@contextmanager
+def priority(level: str) -> Iterator[None]:
+    """Run the enclosed LLM calls at this priority (INTERACTIVE by default)."""
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _get_queue(provider: str) -> _Queue:
+    with _lock:
+        queue = _queues.get(provider)
+        if queue is None:
+            queue = _queues[provider] = _Queue()
+        return queue
+
+
+def _bucket(per_minute: int) -> tuple[float, float]:
+    """(capacity, refill per second) of a bucket for a per-minute limit."""
+    # At most half the limit, so the bucket always refills even for tiny limits
+    capacity = min(max(1.0, per_minute * LLM_RATE_BURST_FRACTION), per_minute / 2)
+    return capacity, (per_minute - capacity) / 60
+
+
+def _refill(provider: str, now: float) -> tuple[float, float]:
+    """The provider's (requests, tokens) available now; call in an immediate transaction."""
+    rpm, tpm = LLM_RATE_LIMITS.get(provider, (0, 0))
+    request_capacity, request_rate = _bucket(rpm)
+    token_capacity, token_rate = _bucket(tpm)
+    state = database.get_rate_bucket(provider)
+    if state is None:
+        return request_capacity, token_capacity
+    elapsed = max(0.0, now - state["updated_at"])
+    return (
+        min(request_capacity, state["requests"] + elapsed * request_rate),
+        min(token_capacity, state["tokens"] + elapsed * token_rate),
+    )
+
+
+def _take(provider: str, tokens: float, reserve: float) -> float:
+    """Draw one request and tokens from the shared bucket; 0, or the seconds to wait."""
+    rpm, tpm = LLM_RATE_LIMITS.get(provider, (0, 0))
+    now = time.time()
+    with database.transaction(immediate=True):
+        requests_left, tokens_left = _refill(provider, now)
+        wait = 0.0
+        for limit, available, need in ((rpm, requests_left, 1.0), (tpm, tokens_left, tokens)):
+            if not limit:
+                continue
+            capacity, rate = _bucket(limit)
+            # A call larger than the burst waits for a full bucket and leaves it
+            # in debt, which later calls wait out
+            need = min(capacity, need + reserve * capacity)
+            if available < need:
+                wait = max(wait, (need - available) / rate if rate else float("inf"))
+        if wait == 0.0:
+            requests_left -= 1.0 if rpm else 0.0
+            tokens_left -= tokens if tpm else 0.0
+        database.put_rate_bucket(provider, requests_left, tokens_left, now)
+    return wait
+
+
+def _report_depth(provider: str, queue: _Queue) -> None:
+    for level, rank in _RANK.items():
+        depth = sum(1 for waiting_rank, _ in queue.waiting if waiting_rank == rank)
+        metrics.set_gauge("mirror_llm_queue_depth", depth, provider=provider, priority=level)
+
+
+def acquire(provider: str, tokens: int, timeout: float) -> None:
+    """
+    Wait until one call of about tokens tokens (prompt plus output) fits in
+    the provider's limits, then charge it. Raises QuotaTimeout when that
+    cannot happen within timeout seconds.
+    """
+    rpm, tpm = LLM_RATE_LIMITS.get(provider, (0, 0))
+    if not LLM_SCHEDULER_ENABLED or not (rpm or tpm):
+        return
+    level = _priority.get()
+    reserve = LLM_INTERACTIVE_RESERVE if level == BACKGROUND else 0.0
+    ticket = (_RANK[level], next(_arrivals))
+    queue = _get_queue(provider)
+    start = time.monotonic()
+    end = start + timeout
+
+    with queue.cond:
+        bisect.insort(queue.waiting, ticket)
+        _report_depth(provider, queue)
+        # Let a head of lower priority step back behind this call
+        queue.cond.notify_all()
+    try:
+        while True:
+            with queue.cond:
+                while queue.waiting[0] != ticket:
+                    remaining = end - time.monotonic()
+                    if remaining <= 0:
+                        raise QuotaTimeout(f"{provider}: queued behind other calls until timeout")
+                    queue.cond.wait(remaining)
+            wait = _take(provider, tokens, reserve)
+            if wait == 0.0:
+                break
+            if time.monotonic() + wait > end:
+                raise QuotaTimeout(f"{provider}: rate limit leaves no room for {wait:.1f}s")
+            with queue.cond:
+                queue.cond.wait(wait)
+    finally:
+        with queue.cond:
+            queue.waiting.remove(ticket)
+            _report_depth(provider, queue)
+            queue.cond.notify_all()
+    metrics.observe(
+        "mirror_llm_queue_wait_seconds", time.monotonic() - start,
+        provider=provider, priority=level,
+    )
+
+
+def settle(provider: str, charged: int, used: int) -> None:
+    """Return the tokens a call was charged beyond what it used (or charge the excess)."""
+    rpm, tpm = LLM_RATE_LIMITS.get(provider, (0, 0))
+    if not LLM_SCHEDULER_ENABLED or not tpm or charged == used:
+        return
+    now = time.time()
+    with database.transaction(immediate=True):
+        requests_left, tokens_left = _refill(provider, now)
+        capacity, _ = _bucket(tpm)
+        database.put_rate_bucket(
+            provider, requests_left, min(capacity, tokens_left + charged - used), now
+        )
+    queue = _get_queue(provider)
+    with queue.cond:
+        queue.cond.notify_all()
+
+
+def throttled(provider: str) -> None:
+    """The provider answered 429 anyway (e.g. another client shares the key): empty its bucket."""
+    metrics.inc("mirror_llm_rate_limited_total", provider=provider)
+    if not LLM_SCHEDULER_ENABLED:
+        return
+    with database.transaction(immediate=True):
+        database.put_rate_bucket(provider, 0.0, 0.0, time.time())
+
+
+def status() -> dict[str, dict]:
+    """Limits and queued calls per provider in this process."""
+    with _lock:
+        queues = dict(_queues)
+    result = {}
+    for provider, (rpm, tpm) in LLM_RATE_LIMITS.items():
+        queued = {level: 0 for level in _RANK}
+        queue = queues.get(provider)
+        if queue is not None:
+            with queue.cond:
+                for rank, _ in queue.waiting:
+                    queued[next(level for level, r in _RANK.items() if r == rank)] += 1
+        result[provider] = {
+            "requests_per_minute": rpm, "tokens_per_minute": tpm, "queued": queued,
+        }
+    return result
@@ -1,15 +1,48 @@
+import asyncio
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Literal
 from uuid import uuid4
 
-from fastapi import FastAPI, HTTPException, Header
+import numpy as np
+from fastapi import FastAPI, HTTPException, Header, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-
-from backend import categorizer, consistency, database, embeddings, graph_builder
-from backend.config import CATEGORIES, FRAMEWORKS, QUESTION_BANK, get_categories
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+from backend import (
+    categorizer,
+    consistency,
+    database,
+    embeddings,
+    graph_builder,
+    jobs,
+    llm_router,
+    llm_scheduler,
+    metrics,
+    warmup,
+)
+from backend.config import (
+    CATEGORIES,
+    CONSISTENCY_DEADLINE_SECONDS,
+    FRAMEWORKS,
+    MAX_NEIGHBORS,
+    QUESTION_BANK,
+    QUESTION_BATCH_MAX_ITEMS,
+    SIMILARITY_MAX_DISTANCE,
+    get_categories,
+)
 from backend.models import (
     CheckRequest,
     CheckResponse,
     ConsistencyResult,
     GraphData,
+    GraphDelta,
+    JobStatus,
+    QuestionBatchCreate,
     QuestionCreate,
     QuestionResponse,
 )
@@ -22,12 +55,50 @@ app.add_middleware(
     allow_credentials=False,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Per-route latency and the Server-Timing breakdown of every response
+app.add_middleware(metrics.TimingMiddleware)
 
 
 @app.on_event("startup")
 def startup():
     database.init_db()
+    jobs.start_workers()
+    # Model, prototypes and vector index load in the background; see /readyz
+    warmup.start()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    jobs.stop_workers()
+
+
+@app.get("/healthz")
+def healthz() -> dict:
+    """Liveness: the process is up and serving requests."""
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz(response: Response) -> dict:
+    """Readiness: the database is initialized and the warm-up has finished."""
+    state = warmup.status()
+    if not state["ready"]:
+        response.status_code = 503
+    return state
+
+
+@app.get("/metrics")
+def get_metrics() -> PlainTextResponse:
+    """Stage latencies, LLM calls and cache hit ratios in Prometheus text format."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/llm/status")
+def llm_status() -> dict:
+    """Circuit breaker state, rate limits and queued calls per LLM provider."""
+    return {"circuits": llm_router.status(), "rate_limits": llm_scheduler.status()}
 
 
 @app.get("/api/frameworks")
@@ -56,6 +127,54 @@ def get_prompts(framework_id: str = "agency") -> dict:
     return {"framework_id": framework_id, "prompts": prompts}
 
 
+def _verdict_color(is_consistent: bool | None) -> str:
+    if is_consistent is None:
+        return "#9ca3af"
+    return "#22c55e" if is_consistent else "#ef4444"
+
+
+def _consistency_result(
+    source_id: str, target: QuestionResponse, verdict: dict
+) -> ConsistencyResult:
+    return ConsistencyResult(
+        source_id=source_id,
+        target_id=target.id,
+        is_consistent=verdict["is_consistent"],
+        explanation=verdict["explanation"],
+        color=_verdict_color(verdict["is_consistent"]),
+        target_text=target.text,
+        target_answer=target.answer,
+        tier=verdict.get("tier", "llm"),
+    )
+
+
+def _find_neighbors(
+    text: str, session_id: str, category: str, vector: np.ndarray
+) -> tuple[list[QuestionResponse], dict[str, float]]:
+    """
+    Stored statements of this session and category worth checking against text,
+    plus their cosine similarity to it keyed by id (for the local pre-filter).
+    """
+    similar = embeddings.search_similar(
+        text, n=MAX_NEIGHBORS, session_id=session_id, category=category,
+        max_distance=SIMILARITY_MAX_DISTANCE, embedding=vector,
+    )
+    stored = database.get_questions_by_ids([sim_id for sim_id, *_ in similar])
+    neighbors: list[QuestionResponse] = []
+    similarities: dict[str, float] = {}
+
+    for sim_id, sim_text, sim_category, sim_distance in similar:
+        existing = stored.get(sim_id)
+        if existing is None:
+            continue
+        # Only compare within same session
+        if existing.session_id != session_id:
+            continue
+        neighbors.append(existing)
+        similarities[sim_id] = 1.0 - sim_distance
+    return neighbors, similarities
+
+
 @app.post("/api/questions")
 def create_question(
     body: QuestionCreate,
@@ -64,52 +183,260 @@ def create_question(
     session_id = body.session_id if body.session_id != "default" else x_session_id
     question_id = str(uuid4())
     categories = get_categories(body.framework_id)
-    category = categorizer.categorize(body.text, list(categories.keys()))
+    # Encode once and share the vector with categorization, storage and search
+    vector = embeddings.encode(body.text)
+    category = categorizer.categorize(body.text, list(categories.keys()), embedding=vector)
+
+    neighbors, similarities = _find_neighbors(body.text, session_id, category, vector)
+    # Pairs the local pre-filter can settle are answered right away
+    local, remaining = consistency.prefilter(body.text, body.answer, neighbors, similarities)
+    by_id = {neighbor.id: neighbor for neighbor in neighbors}
+
+    # Store the question, its local verdicts and the job for the remaining
+    # neighbors in one transaction; the job workers write edges as verdicts
+    # arrive (poll GET /api/jobs/{job_id})
+    with database.transaction():
+        question = database.add_question(
+            question_id, body.text, body.answer, category, session_id, body.framework_id
+        )
+        database.add_edges([
+            (str(uuid4()), question_id, neighbor_id,
+             verdict["is_consistent"], verdict["explanation"], session_id, verdict["tier"])
+            for neighbor_id, verdict in local.items()
+        ])
+        job_id = None
+        if remaining:
+            job_id = jobs.enqueue(session_id, question_id, [n.id for n in remaining])
+    if job_id is not None:
+        jobs.notify()
+    embeddings.add_embedding(
+        question_id, body.text, category, session_id, body.framework_id,
+        embedding=vector,
+    )
+
+    consistency_results = [
+        _consistency_result(question_id, by_id[neighbor_id], verdict)
+        for neighbor_id, verdict in local.items()
+    ]
+    return {"question": question, "consistency": consistency_results, "job_id": job_id}
+
+
+def _similarity_matrix(vectors: np.ndarray) -> np.ndarray:
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    return normalized @ normalized.T
+
+
+def _intra_batch_pairs(
+    vectors: np.ndarray, categories: list[str]
+) -> list[list[int]]:
+    """
+    For each batch item i, pick the later items j > i worth checking against it.
+
+    Pairs must share a category and lie within SIMILARITY_MAX_DISTANCE. Each
+    unordered pair is assigned to its earlier item only, so it is judged once.
+    """
+    similarity = _similarity_matrix(vectors)
+    pairs: list[list[int]] = []
+    for i in range(len(categories)):
+        candidates = [
+            j for j in range(i + 1, len(categories))
+            if categories[j] == categories[i]
+            and 1.0 - similarity[i, j] <= SIMILARITY_MAX_DISTANCE
+        ]
+        candidates.sort(key=lambda j: -similarity[i, j])
+        pairs.append(candidates[:MAX_NEIGHBORS])
+    return pairs
+
+
+@app.post("/api/questions/batch")
+def create_questions_batch(
+    body: QuestionBatchCreate,
+    x_session_id: str = Header(default="default"),
+) -> dict:
+    """
+    Add many statements at once (e.g. a whole question bank during onboarding).
+
+    Encoding, categorization, neighbor search and storage are all done in bulk,
+    and every candidate pair, within the batch or against the session's
+    existing statements, is judged exactly once.
+    """
+    if not body.items:
+        return {"questions": [], "consistency": []}
+    if len(body.items) > QUESTION_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {QUESTION_BATCH_MAX_ITEMS} statements per batch",
+        )
 
-    question = database.add_question(question_id, body.text, body.answer, category, session_id)
-    embeddings.add_embedding(question_id, body.text, category)
+    session_id = body.session_id if body.session_id != "default" else x_session_id
+    texts = [item.text for item in body.items]
+    vectors = embeddings.encode_many(texts)
+    categories = categorizer.categorize_many(
+        vectors, list(get_categories(body.framework_id).keys())
+    )
+    questions = [
+        QuestionResponse(
+            id=str(uuid4()), text=item.text, answer=item.answer, category=category,
+            created_at=datetime.utcnow().isoformat(), session_id=session_id,
+            framework_id=body.framework_id,
+        )
+        for item, category in zip(body.items, categories)
+    ]
+
+    # Existing neighbors: one Chroma query per category present in the batch
+    existing_ids: list[list[str]] = [[] for _ in questions]
+    similarities: list[dict[str, float]] = [{} for _ in questions]
+    for category in set(categories):
+        rows = [i for i, c in enumerate(categories) if c == category]
+        hits = embeddings.search_similar_many(
+            vectors[rows], n=MAX_NEIGHBORS, session_id=session_id, category=category,
+            max_distance=SIMILARITY_MAX_DISTANCE,
+        )
+        for i, similar in zip(rows, hits):
+            existing_ids[i] = [sim_id for sim_id, *_ in similar]
+            similarities[i] = {sim_id: 1.0 - dist for sim_id, _, _, dist in similar}
+    stored = database.get_questions_by_ids(
+        sorted({sim_id for ids in existing_ids for sim_id in ids})
+    )
 
-    # Find similar questions and check consistency within same session
-    similar = embeddings.search_similar(body.text, n=10)
+    intra = _intra_batch_pairs(vectors, categories)
+    similarity = _similarity_matrix(vectors)
+    groups = []
+    for i, question in enumerate(questions):
+        neighbors = [
+            stored[sim_id] for sim_id in existing_ids[i]
+            if sim_id in stored and stored[sim_id].session_id == session_id
+        ]
+        neighbors.extend(questions[j] for j in intra[i])
+        similarities[i].update({questions[j].id: float(similarity[i, j]) for j in intra[i]})
+        groups.append((question.text, question.answer, neighbors))
+
+    verdicts = consistency.check_consistency_groups(groups, similarities=similarities)
     consistency_results: list[ConsistencyResult] = []
+    edge_rows = []
+    for question, (_, _, neighbors), group_verdicts in zip(questions, groups, verdicts):
+        for neighbor in neighbors:
+            result = group_verdicts[neighbor.id]
+            # Unknown verdicts (provider errors, deadline) are reported but not stored
+            if result["is_consistent"] is not None:
+                edge_rows.append((
+                    str(uuid4()), question.id, neighbor.id,
+                    result["is_consistent"], result["explanation"], session_id,
+                    result.get("tier", "llm"),
+                ))
+            consistency_results.append(_consistency_result(question.id, neighbor, result))
+
+    with database.transaction():
+        database.add_questions(questions)
+        database.add_edges(edge_rows)
+    embeddings.add_embeddings(
+        [q.id for q in questions], texts, categories, vectors, session_id, body.framework_id
+    )
 
-    for sim_id, sim_text, sim_category, sim_distance in similar:
-        if sim_id == question_id:
-            continue
-        if sim_category != category:
-            continue
+    return {"questions": questions, "consistency": consistency_results}
 
-        existing = database.get_question(sim_id)
-        if existing is None:
-            continue
-        # Only compare within same session
-        if existing.session_id != session_id:
-            continue
 
-        result = consistency.check_consistency(
-            body.text, body.answer, existing.text, existing.answer
-        )
+def _ndjson(event: str, **payload) -> str:
+    return json.dumps({"event": event, **jsonable_encoder(payload)}) + "\n"
 
-        edge_id = str(uuid4())
-        is_consistent = result["is_consistent"]
-        explanation = result["explanation"]
-
-        database.add_edge(edge_id, question_id, sim_id, is_consistent, explanation, session_id)
-
-        color = "#22c55e" if is_consistent else "#ef4444"
-        consistency_results.append(
-            ConsistencyResult(
-                source_id=question_id,
-                target_id=sim_id,
-                is_consistent=is_consistent,
-                explanation=explanation,
-                color=color,
-                target_text=existing.text,
-                target_answer=existing.answer,
-            )
+
+@app.post("/api/questions/stream")
+async def create_question_stream(
+    body: QuestionCreate,
+    x_session_id: str = Header(default="default"),
+) -> StreamingResponse:
+    """
+    Streaming variant of POST /api/questions, emitting NDJSON events.
+
+    Emits a "question" event as soon as the statement is stored, one
+    "consistency" event per verdict as it arrives (its edge already written),
+    then a "done" summary. If the client disconnects, batches not yet started
+    are cancelled and running ones send no further single-pair re-checks; a
+    provider call already in flight still completes.
+    """
+    session_id = body.session_id if body.session_id != "default" else x_session_id
+    question_id = str(uuid4())
+    categories = get_categories(body.framework_id)
+
+    def store_and_find_neighbors():
+        vector = embeddings.encode(body.text)
+        category = categorizer.categorize(body.text, list(categories.keys()), embedding=vector)
+        neighbors, similarities = _find_neighbors(body.text, session_id, category, vector)
+        question = database.add_question(
+            question_id, body.text, body.answer, category, session_id, body.framework_id
+        )
+        embeddings.add_embedding(
+            question_id, body.text, category, session_id, body.framework_id,
+            embedding=vector,
         )
+        return question, neighbors, similarities
+
+    question, neighbors, similarities = await run_in_threadpool(store_and_find_neighbors)
+    by_id = {neighbor.id: neighbor for neighbor in neighbors}
+
+    async def events():
+        yield _ndjson("question", question=question, category=question.category)
+        cancelled = threading.Event()
+        ready, futures = await run_in_threadpool(
+            consistency.submit_consistency_checks,
+            body.text, body.answer, neighbors, similarities,
+            time.monotonic() + CONSISTENCY_DEADLINE_SECONDS, cancelled=cancelled,
+        )
+        contradictions = 0
+        unknown = 0
+        emitted: set[str] = set()
+
+        async def emit(verdicts: dict[str, dict]):
+            nonlocal contradictions, unknown
+            rows = [
+                (str(uuid4()), question_id, neighbor_id,
+                 verdict["is_consistent"], verdict["explanation"], session_id,
+                 verdict.get("tier", "llm"))
+                for neighbor_id, verdict in verdicts.items()
+                if verdict["is_consistent"] is not None
+            ]
+            await run_in_threadpool(database.add_edges, rows)
+            for neighbor_id, verdict in verdicts.items():
+                emitted.add(neighbor_id)
+                if verdict["is_consistent"] is None:
+                    unknown += 1
+                elif not verdict["is_consistent"]:
+                    contradictions += 1
+                result = _consistency_result(question_id, by_id[neighbor_id], verdict)
+                yield _ndjson("consistency", result=result)
+
+        try:
+            async for line in emit(ready):
+                yield line
+            pending = [asyncio.wrap_future(future) for future in futures]
+            try:
+                for next_batch in asyncio.as_completed(
+                    pending, timeout=CONSISTENCY_DEADLINE_SECONDS
+                ):
+                    async for line in emit(await next_batch):
+                        yield line
+            except asyncio.TimeoutError:
+                timed_out = {
+                    neighbor.id: consistency.error_result("deadline exceeded")
+                    for neighbor in neighbors
+                    if neighbor.id not in emitted
+                }
+                async for line in emit(timed_out):
+                    yield line
+            yield _ndjson(
+                "done",
+                question_id=question_id,
+                checked=len(emitted),
+                contradictions=contradictions,
+                unknown=unknown,
+            )
+        finally:
+            # Runs on completion and when the client goes away mid-stream
+            cancelled.set()
+            for future in futures:
+                future.cancel()
 
-    return {"question": question, "consistency": consistency_results}
+    return StreamingResponse(events(), media_type="application/x-ndjson")
 
 
 @app.get("/api/questions")
@@ -119,16 +446,97 @@ def list_questions(x_session_id: str = Header(default="default")) -> list[Questi
 
 @app.delete("/api/questions/{question_id}")
 def delete_question(question_id: str) -> dict:
-    deleted = database.delete_question(question_id)
-    if not deleted:
+    question = database.get_question(question_id)
+    if question is None or not database.delete_question(question_id):
         raise HTTPException(status_code=404, detail="Question not found")
-    embeddings.delete_embedding(question_id)
+    embeddings.delete_embedding(question_id, question.session_id)
     return {"deleted": True}
 
 
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str) -> JobStatus:
+    job = database.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    results = []
+    for task in job["tasks"]:
+        if task["status"] == "done":
+            is_consistent = None if task["is_consistent"] is None else bool(task["is_consistent"])
+            verdict = {
+                "is_consistent": is_consistent,
+                "explanation": task["explanation"],
+                "tier": task["tier"],
+            }
+        elif task["status"] == "failed":
+            # Out of retries: reported as unknown, like any other unjudged pair
+            verdict = consistency.error_result(task["last_error"] or "unknown error")
+        else:
+            continue
+        results.append(ConsistencyResult(
+            source_id=job["question_id"],
+            target_id=task["neighbor_id"],
+            is_consistent=verdict["is_consistent"],
+            explanation=verdict["explanation"],
+            color=_verdict_color(verdict["is_consistent"]),
+            target_text=task["text"] or "",
+            target_answer=task["answer"] or "",
+            tier=verdict["tier"],
+        ))
+    return JobStatus(
+        id=job["id"],
+        question_id=job["question_id"],
+        status=jobs.job_status(job),
+        total=job["total"],
+        completed=sum(1 for task in job["tasks"] if task["status"] == "done"),
+        failed=sum(1 for task in job["tasks"] if task["status"] == "failed"),
+        results=results,
+    )
+
+
 @app.get("/api/graph")
-def get_graph(x_session_id: str = Header(default="default")) -> GraphData:
-    return graph_builder.build_graph(session_id=x_session_id)
+def get_graph(
+    response: Response,
+    since: int | None = None,
+    view: Literal["full", "summary"] = "full",
+    x_session_id: str = Header(default="default"),
+    if_none_match: str | None = Header(default=None),
+) -> GraphData | GraphDelta:
+    """
+    The session's graph, tagged with its version as the ETag.
+
+    A matching If-None-Match gets 304 Not Modified; ?since=<version> returns
+    only what changed after that version. ?view=summary returns just the
+    category hubs and aggregate edges between them (expand a hub with
+    GET /api/graph/categories/{category}).
+    """
+    def etag(version: int) -> str:
+        return f'"{version}"' if view == "full" else f'"{version}-{view}"'
+
+    headers = {"ETag": etag(database.get_graph_version(x_session_id)), "Vary": "X-Session-ID"}
+    if if_none_match == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+
+    if view == "summary":
+        graph = graph_builder.build_summary_graph(x_session_id)
+    elif since is None:
+        graph = graph_builder.build_graph(session_id=x_session_id)
+    else:
+        graph = graph_builder.build_graph_delta(x_session_id, since)
+    # The graph may have moved on between the check above and the build
+    response.headers.update({**headers, "ETag": etag(graph.version)})
+    return graph
+
+
+@app.get("/api/graph/categories/{category}")
+def get_category_graph(
+    category: str, x_session_id: str = Header(default="default")
+) -> GraphData:
+    """Question nodes of one category hub, and the edges touching them."""
+    graph = graph_builder.build_category_graph(x_session_id, category)
+    if graph is None:
+        raise HTTPException(status_code=404, detail="Category not found")
+    return graph
 
 
 @app.post("/api/check")
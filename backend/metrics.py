@@ -0,0 +1,347 @@
+"""
+Low-overhead timings and counters for the hot path.
+
+stage("encode.model") and @timed("sqlite") record how long a stage took into
+a latency histogram and, during a request, into that request's breakdown,
+which TimingMiddleware returns as a Server-Timing header. Stages are grouped
+by the part of their name before the first dot ("sqlite.add_question" counts
+as "sqlite"), and a stage nested in another of the same group is part of the
+outer one rather than timed twice. render() produces the Prometheus text
+served at GET /metrics.
+
+With PROFILING_ENABLED, a request carrying "X-Profile: 1" is sampled every
+PROFILE_INTERVAL_MS: the threads that run its stages have their stacks
+written, in folded flame-graph format, to a file named in the X-Profile
+response header.
+"""
+from __future__ import annotations
+
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from pathlib import Path
+from time import perf_counter
+
+from starlette.concurrency import run_in_threadpool
+
+from backend.config import METRICS_ENABLED, PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILING_ENABLED
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_HELP = {
+    "mirror_request_duration_seconds": ("histogram", "HTTP request latency by route"),
+    "mirror_stage_duration_seconds": ("histogram", "Latency of one hot-path stage"),
+    "mirror_requests_total": ("counter", "HTTP responses by route and status"),
+    "mirror_llm_requests_total": ("counter", "LLM API calls by provider"),
+    "mirror_llm_errors_total": ("counter", "Failed LLM API calls by provider"),
+    "mirror_llm_hedges_total": ("counter", "Hedged LLM calls by the provider they went to"),
+    "mirror_llm_breaker_opens_total": ("counter", "Times a provider's circuit breaker opened"),
+    "mirror_llm_queue_depth": ("gauge", "LLM calls waiting for rate-limit budget, by priority"),
+    "mirror_llm_queue_wait_seconds": ("histogram", "Time LLM calls waited for rate-limit budget"),
+    "mirror_llm_rate_limited_total": ("counter", "LLM calls the provider rejected with HTTP 429"),
+    "mirror_encoder_batches_total": ("counter", "Model batches run by the encoder thread"),
+    "mirror_encoder_texts_total": ("counter", "Texts encoded by the encoder thread"),
+    "mirror_cache_hits_total": ("counter", "Cache lookups answered from the cache"),
+    "mirror_cache_misses_total": ("counter", "Cache lookups that missed"),
+    "mirror_cache_hit_ratio": ("gauge", "Share of cache lookups answered from the cache"),
+}
+
+Labels = tuple[tuple[str, str], ...]
+
+_lock = threading.Lock()
+# (name, labels) -> [count per bucket (last one is +Inf), sum]
+_histograms: dict[tuple[str, Labels], list] = {}
+_counters: dict[tuple[str, Labels], float] = {}
+_gauges: dict[tuple[str, Labels], float] = {}
+# Stage groups open on this thread, so nested stages are not timed twice
+_open = threading.local()
+
+
+class _Request:
+    __slots__ = ("lock", "stages", "sampler")
+
+    def __init__(self):
+        # Stages finish on executor threads as well as the request's own
+        self.lock = threading.Lock()
+        self.stages: dict[str, float] = {}
+        self.sampler: _Sampler | None = None
+
+    def add_stage(self, group: str, seconds: float) -> None:
+        with self.lock:
+            self.stages[group] = self.stages.get(group, 0.0) + seconds
+
+    def server_timing(self, total: float) -> bytes:
+        with self.lock:
+            stages = list(self.stages.items())
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages]
+        entries.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(entries).encode("latin-1")
+
+
+_current: ContextVar[_Request | None] = ContextVar("metrics_request", default=None)
+
+
+def _observe(key: tuple[str, Labels], seconds: float) -> None:
+    index = bisect_left(BUCKETS, seconds)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [[0] * (len(BUCKETS) + 1), 0.0]
+        histogram[0][index] += 1
+        histogram[1] += seconds
+
+
+def observe(name: str, seconds: float, **labels: str) -> None:
+    if not METRICS_ENABLED:
+        return
+    _observe((name, tuple(sorted(labels.items()))), seconds)
+
+
+def inc(name: str, amount: float = 1.0, **labels: str) -> None:
+    if not METRICS_ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + amount
+
+
+def set_gauge(name: str, value: float, **labels: str) -> None:
+    if not METRICS_ENABLED:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _gauges[key] = value
+
+
+def count_cache(cache: str, hits: int, misses: int) -> None:
+    """Record the outcome of cache lookups; /metrics derives the hit ratio."""
+    if hits:
+        inc("mirror_cache_hits_total", hits, cache=cache)
+    if misses:
+        inc("mirror_cache_misses_total", misses, cache=cache)
+
+
+def _open_groups() -> set[str]:
+    groups = getattr(_open, "groups", None)
+    if groups is None:
+        groups = _open.groups = set()
+    return groups
+
+
+def _finish(
+    key: tuple[str, Labels], group: str, groups: set[str],
+    request: _Request | None, start: float,
+) -> None:
+    elapsed = perf_counter() - start
+    groups.discard(group)
+    _observe(key, elapsed)
+    if request is not None:
+        request.add_stage(group, elapsed)
+
+
+def _begin(group: str) -> tuple[set[str], _Request | None] | None:
+    """Open a stage of group on this thread; None if it should not be timed."""
+    groups = _open_groups()
+    if not METRICS_ENABLED or group in groups:
+        return None
+    request = _current.get()
+    if request is not None and request.sampler is not None:
+        request.sampler.add_thread(threading.get_ident())
+    groups.add(group)
+    return groups, request
+
+
+def _stage_key(name: str) -> tuple[str, Labels]:
+    return ("mirror_stage_duration_seconds", (("stage", name),))
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the enclosed block as one hot-path stage."""
+    group = name.partition(".")[0]
+    opened = _begin(group)
+    if opened is None:
+        yield
+        return
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        _finish(_stage_key(name), group, *opened, start)
+
+
+def timed(group: str) -> Callable:
+    """Decorator: time every call of the function as stage "<group>.<name>"."""
+    def decorate(func: Callable) -> Callable:
+        key = _stage_key(f"{group}.{func.__name__}")
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            opened = _begin(group)
+            if opened is None:
+                return func(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _finish(key, group, *opened, start)
+
+        return wrapper
+
+    return decorate
+
+
+class _Sampler:
+    """Samples the stacks of the threads a request runs on until stopped."""
+
+    def __init__(self, interval: float):
+        self._interval = interval
+        # Request threads add themselves while the sampler thread reads
+        self._lock = threading.Lock()
+        self._threads: set[int] = set()
+        self._stacks: Counter[str] = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def add_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads.add(ident)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self._interval):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads)
+            for ident in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    self._stacks[";".join(reversed(stack))] += 1
+
+    def stop(self, label: str) -> str:
+        """Stop sampling and write the folded stacks; returns the file name."""
+        self._stopped.set()
+        self._thread.join()
+        Path(PROFILE_DIR).mkdir(parents=True, exist_ok=True)
+        name = f"{time.time_ns()}-{label}.folded"
+        with open(Path(PROFILE_DIR) / name, "w") as f:
+            for stack, samples in self._stacks.most_common():
+                f.write(f"{stack} {samples}\n")
+        return name
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware: request latency by route, the Server-Timing header, and
+    the per-request profiler.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        request = _Request()
+        if PROFILING_ENABLED and (b"x-profile", b"1") in scope["headers"]:
+            request.sampler = _Sampler(PROFILE_INTERVAL_MS / 1000)
+        token = _current.set(request)
+        start = perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", request.server_timing(perf_counter() - start)))
+                if request.sampler is not None:
+                    label = re.sub(r"[^A-Za-z0-9]+", "_", scope["path"]).strip("_")
+                    # Joining the sampler and writing its file must not block the loop
+                    name = await run_in_threadpool(request.sampler.stop, label)
+                    headers.append((b"x-profile", name.encode()))
+                    request.sampler = None
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            if request.sampler is not None:
+                await run_in_threadpool(request.sampler.stop, "failed")
+            # Label by route template, not the raw path, to bound cardinality
+            route = getattr(scope.get("route"), "path", "unmatched")
+            observe(
+                "mirror_request_duration_seconds", perf_counter() - start,
+                method=scope["method"], route=route,
+            )
+            inc("mirror_requests_total", method=scope["method"], route=route, status=str(status))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: tuple[tuple[str, str], ...] = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {key: ([*counts], total) for key, (counts, total) in _histograms.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+
+    samples: dict[str, list[str]] = {}
+    for (name, labels), (counts, total) in sorted(histograms.items()):
+        lines = samples.setdefault(name, [])
+        cumulative = 0
+        for bound, count in zip((*BUCKETS, float("inf")), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', le),))} {cumulative}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {cumulative}")
+    for (name, labels), value in sorted(counters.items()):
+        samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value:.15g}")
+    for (name, labels), value in sorted(gauges.items()):
+        samples.setdefault(name, []).append(f"{name}{_format_labels(labels)} {value:.15g}")
+
+    caches = {
+        labels for name, labels in counters
+        if name in ("mirror_cache_hits_total", "mirror_cache_misses_total")
+    }
+    for labels in sorted(caches):
+        hits = counters.get(("mirror_cache_hits_total", labels), 0.0)
+        misses = counters.get(("mirror_cache_misses_total", labels), 0.0)
+        samples.setdefault("mirror_cache_hit_ratio", []).append(
+            f"mirror_cache_hit_ratio{_format_labels(labels)} {hits / (hits + misses):.6f}"
+        )
+
+    out = []
+    for name, lines in samples.items():
+        kind, help_text = _HELP.get(name, ("untyped", name))
+        out.append(f"# HELP {name} {help_text}")
+        out.append(f"# TYPE {name} {kind}")
+        out.extend(lines)
+    return "\n".join(out) + "\n"
@@ -8,6 +8,17 @@ class QuestionCreate(BaseModel):
     session_id: str = "default"
 
 
+class QuestionBatchItem(BaseModel):
+    text: str
+    answer: str
+
+
+class QuestionBatchCreate(BaseModel):
+    items: list[QuestionBatchItem]
+    framework_id: str = "agency"
+    session_id: str = "default"
+
+
 class QuestionResponse(BaseModel):
     id: str
     text: str
@@ -15,16 +26,29 @@ class QuestionResponse(BaseModel):
     category: str
     created_at: str
     session_id: str = "default"
+    framework_id: str = "agency"
 
 
 class ConsistencyResult(BaseModel):
     source_id: str
     target_id: str
-    is_consistent: bool
+    # None when the pair could not be judged (provider errors or deadline)
+    is_consistent: bool | None
     explanation: str
     color: str
     target_text: str = ""
     target_answer: str = ""
+    tier: str = "llm"
+
+
+class JobStatus(BaseModel):
+    id: str
+    question_id: str
+    status: str
+    total: int
+    completed: int
+    failed: int
+    results: list[ConsistencyResult]
 
 
 class GraphNode(BaseModel):
@@ -46,6 +70,17 @@ class GraphEdge(BaseModel):
 class GraphData(BaseModel):
     nodes: list[GraphNode]
     edges: list[GraphEdge]
+    version: int = 0
+
+
+class GraphDelta(BaseModel):
+    version: int
+    since: int
+    # Added nodes, plus existing nodes whose position changed
+    nodes: list[GraphNode]
+    edges: list[GraphEdge]
+    removed_nodes: list[str]
+    removed_edges: list[str]
 
 
 class CheckRequest(BaseModel):
@@ -56,7 +91,7 @@ class CheckRequest(BaseModel):
 
 
 class CheckResponse(BaseModel):
-    is_consistent: bool
+    is_consistent: bool | None
     explanation: str
 
 
@@ -83,3 +118,132 @@ CREATE TABLE IF NOT EXISTS consistency_edges (
     FOREIGN KEY (target_id) REFERENCES questions(id)
 );
 """
+
+CREATE_VERDICT_CACHE_TABLE = """
+CREATE TABLE IF NOT EXISTS verdict_cache (
+    key TEXT PRIMARY KEY,
+    is_consistent BOOLEAN NOT NULL,
+    explanation TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+CREATE_VERDICT_CACHE_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_verdict_cache_created_at ON verdict_cache (created_at);
+"""
+
+CREATE_EMBEDDING_CACHE_TABLE = """
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    key TEXT PRIMARY KEY,
+    vector BLOB NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+CREATE_EMBEDDING_CACHE_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_embedding_cache_created_at ON embedding_cache (created_at);
+"""
+
+CREATE_RATE_BUCKETS_TABLE = """
+CREATE TABLE IF NOT EXISTS llm_rate_buckets (
+    provider TEXT PRIMARY KEY,
+    requests REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+CREATE_LOOKUP_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_questions_session_created ON questions (session_id, created_at);",
+    "CREATE INDEX IF NOT EXISTS idx_edges_session ON consistency_edges (session_id);",
+    "CREATE INDEX IF NOT EXISTS idx_edges_source ON consistency_edges (source_id);",
+    "CREATE INDEX IF NOT EXISTS idx_edges_target ON consistency_edges (target_id);",
+]
+
+CREATE_SCHEMA_VERSION_TABLE = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    applied_at TEXT NOT NULL
+);
+"""
+
+CREATE_JOBS_TABLE = """
+CREATE TABLE IF NOT EXISTS consistency_jobs (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    question_id TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    created_at TEXT NOT NULL
+);
+"""
+
+CREATE_JOB_TASKS_TABLE = """
+CREATE TABLE IF NOT EXISTS consistency_tasks (
+    id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    neighbor_id TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL,
+    is_consistent BOOLEAN,
+    explanation TEXT,
+    last_error TEXT,
+    FOREIGN KEY (job_id) REFERENCES consistency_jobs(id)
+);
+"""
+
+CREATE_JOB_TASKS_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_tasks_status_available ON consistency_tasks (status, available_at);",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_job ON consistency_tasks (job_id);",
+]
+
+CREATE_GRAPH_VERSIONS_TABLE = """
+CREATE TABLE IF NOT EXISTS graph_versions (
+    session_id TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+"""
+
+CREATE_GRAPH_CHANGES_TABLE = """
+CREATE TABLE IF NOT EXISTS graph_changes (
+    session_id TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    item_id TEXT NOT NULL,
+    op TEXT NOT NULL,
+    category TEXT,
+    PRIMARY KEY (session_id, version)
+);
+"""
+
+# Every question/edge insert or delete bumps its session's graph version and
+# logs the change, whichever code path made it
+_GRAPH_CHANGE_TRIGGER = """
+CREATE TRIGGER IF NOT EXISTS {name} AFTER {event} ON {table}
+BEGIN
+    INSERT INTO graph_versions (session_id, version) VALUES ({row}.session_id, 1)
+        ON CONFLICT (session_id) DO UPDATE SET version = version + 1;
+    INSERT INTO graph_changes (session_id, version, kind, item_id, op, category)
+        SELECT {row}.session_id, version, '{kind}', {row}.id, '{op}', {category}
+        FROM graph_versions WHERE session_id = {row}.session_id;
+END;
+"""
+
+CREATE_GRAPH_CHANGE_TRIGGERS = [
+    _GRAPH_CHANGE_TRIGGER.format(
+        name="trg_questions_insert_graph", event="INSERT", table="questions",
+        row="NEW", kind="node", op="add", category="NEW.category",
+    ),
+    _GRAPH_CHANGE_TRIGGER.format(
+        name="trg_questions_delete_graph", event="DELETE", table="questions",
+        row="OLD", kind="node", op="remove", category="OLD.category",
+    ),
+    _GRAPH_CHANGE_TRIGGER.format(
+        name="trg_edges_insert_graph", event="INSERT", table="consistency_edges",
+        row="NEW", kind="edge", op="add", category="NULL",
+    ),
+    _GRAPH_CHANGE_TRIGGER.format(
+        name="trg_edges_delete_graph", event="DELETE", table="consistency_edges",
+        row="OLD", kind="edge", op="remove", category="NULL",
+    ),
+]
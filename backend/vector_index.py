@@ -0,0 +1,329 @@
+"""
+Exact per-session vector index, an alternative to the shared Chroma collection.
+
+Each session lives in its own directory under VECTOR_INDEX_PATH:
+
+    session_id             the session id, for listing sessions
+    manifest.json          {"generation": N, "dim": D}, replaced atomically
+                           on compaction
+    vectors.N.f32          append-only float32 rows, L2-normalized
+    rows.N.jsonl           append-only log: one line per added row
+                           ({"id", "category", "framework_id", "document"})
+                           or deletion ({"delete": id})
+
+The rows log is the source of truth: a vector without its log line (a torn
+append) is ignored and overwritten by the next add. Hot sessions are kept in
+an LRU of VECTOR_INDEX_HOT_SESSIONS entries with the matrix memory-mapped, and
+are reloaded whenever another process has appended to or compacted them.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+
+from backend.config import VECTOR_INDEX_HOT_SESSIONS, VECTOR_INDEX_PATH
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+# Compact a session once it has at least this many deleted rows and more
+# deleted rows than live ones
+_COMPACT_MIN_DELETED = 64
+
+_lock = threading.Lock()
+_sessions: OrderedDict[str, "_Session"] = OrderedDict()
+
+
+@dataclass
+class _Session:
+    stamp: tuple
+    ids: list[str]
+    documents: list[str]
+    categories: np.ndarray
+    framework_ids: list[str]
+    alive: np.ndarray
+    matrix: np.ndarray
+
+    @property
+    def deleted(self) -> int:
+        return len(self.ids) - int(self.alive.sum())
+
+
+def _session_dir(session_id: str) -> Path:
+    digest = hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:24]
+    return Path(VECTOR_INDEX_PATH) / digest
+
+
+def _manifest(directory: Path) -> dict:
+    try:
+        return json.loads((directory / "manifest.json").read_text())
+    except FileNotFoundError:
+        return {"generation": 0, "dim": 0}
+
+
+def _write_manifest(directory: Path, generation: int, dim: int) -> None:
+    tmp = directory / "manifest.tmp"
+    tmp.write_text(json.dumps({"generation": generation, "dim": dim}))
+    os.replace(tmp, directory / "manifest.json")
+
+
+def _paths(directory: Path, generation: int) -> tuple[Path, Path]:
+    return directory / f"vectors.{generation}.f32", directory / f"rows.{generation}.jsonl"
+
+
+def _stamp(directory: Path) -> tuple:
+    generation = _manifest(directory)["generation"]
+    _, rows_path = _paths(directory, generation)
+    try:
+        size = rows_path.stat().st_size
+    except FileNotFoundError:
+        size = 0
+    return generation, size
+
+
+@contextmanager
+def _file_lock(directory: Path) -> Iterator[None]:
+    """Serialize writers to one session across threads and worker processes."""
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / ".lock", "a") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def _read_rows(rows_path: Path) -> list[dict]:
+    if not rows_path.exists():
+        return []
+    records = []
+    with open(rows_path, encoding="utf-8") as handle:
+        for line in handle:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue  # torn line from an interrupted append
+    return records
+
+
+def _record(record: dict) -> bytes:
+    return (json.dumps(record) + "\n").encode("utf-8")
+
+
+def _end_torn_line(handle) -> None:
+    """Terminate a torn last line so the next record starts on its own line."""
+    handle.seek(0, os.SEEK_END)
+    if handle.tell() == 0:
+        return
+    handle.seek(handle.tell() - 1)
+    if handle.read(1) != b"\n":
+        handle.write(b"\n")
+
+
+def _load(directory: Path) -> _Session:
+    manifest = _manifest(directory)
+    stamp = _stamp(directory)
+    vectors_path, rows_path = _paths(directory, manifest["generation"])
+
+    ids: list[str] = []
+    documents: list[str] = []
+    categories: list[str] = []
+    framework_ids: list[str] = []
+    deleted: set[int] = set()
+    position: dict[str, int] = {}
+    for record in _read_rows(rows_path):
+        if "delete" in record:
+            if record["delete"] in position:
+                deleted.add(position.pop(record["delete"]))
+            continue
+        position[record["id"]] = len(ids)
+        ids.append(record["id"])
+        documents.append(record["document"])
+        categories.append(record["category"])
+        framework_ids.append(record["framework_id"])
+
+    dim = manifest["dim"]
+    if ids:
+        matrix = np.memmap(vectors_path, dtype=np.float32, mode="r", shape=(len(ids), dim))
+    else:
+        matrix = np.empty((0, dim), dtype=np.float32)
+
+    alive = np.ones(len(ids), dtype=bool)
+    alive[list(deleted)] = False
+    return _Session(
+        stamp=stamp,
+        ids=ids,
+        documents=documents,
+        categories=np.array(categories, dtype=object),
+        framework_ids=framework_ids,
+        alive=alive,
+        matrix=matrix,
+    )
+
+
+def _get_session(session_id: str) -> _Session:
+    directory = _session_dir(session_id)
+    stamp = _stamp(directory)
+    with _lock:
+        session = _sessions.get(session_id)
+        if session is not None and session.stamp == stamp:
+            _sessions.move_to_end(session_id)
+            return session
+
+    session = _load(directory)
+    with _lock:
+        _sessions[session_id] = session
+        _sessions.move_to_end(session_id)
+        while len(_sessions) > VECTOR_INDEX_HOT_SESSIONS:
+            _sessions.popitem(last=False)
+    return session
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+def add(
+    session_id: str,
+    ids: list[str],
+    documents: list[str],
+    categories: list[str],
+    framework_id: str,
+    vectors: np.ndarray,
+) -> None:
+    """Append rows to a session's matrix."""
+    if not ids:
+        return
+    directory = _session_dir(session_id)
+    rows = _normalize(vectors)
+    with _file_lock(directory):
+        manifest = _manifest(directory)
+        if not manifest["dim"]:
+            (directory / "session_id").write_text(session_id, encoding="utf-8")
+            _write_manifest(directory, manifest["generation"], rows.shape[1])
+        vectors_path, rows_path = _paths(directory, manifest["generation"])
+        committed = sum(1 for record in _read_rows(rows_path) if "id" in record)
+        with open(vectors_path, "ab") as handle:
+            # Drop any torn tail left by an interrupted append before writing
+            handle.truncate(committed * rows.shape[1] * 4)
+            handle.write(rows.tobytes())
+        with open(rows_path, "ab+") as handle:
+            _end_torn_line(handle)
+            handle.writelines(
+                _record({
+                    "id": id, "category": category,
+                    "framework_id": framework_id, "document": document,
+                })
+                for id, category, document in zip(ids, categories, documents)
+            )
+
+
+def search(
+    queries: np.ndarray,
+    n: int,
+    session_id: str | None = None,
+    category: str | None = None,
+    max_distance: float | None = None,
+) -> list[list[tuple[str, str, str, float]]]:
+    """
+    Exact cosine top-n for every row of queries: (id, document, category, distance).
+
+    Distances are 1 - cosine similarity, matching the Chroma collection.
+    With no session_id every session on disk is searched.
+    """
+    queries = _normalize(queries)
+    if session_id is not None:
+        session_ids = [session_id]
+    else:
+        session_ids = sessions()
+
+    candidates: list[list[tuple[str, str, str, float]]] = [[] for _ in range(len(queries))]
+    for sid in session_ids:
+        session = _get_session(sid)
+        mask = session.alive.copy()
+        if category is not None:
+            mask &= session.categories == category
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            continue
+
+        similarity = queries @ np.asarray(session.matrix[rows]).T
+        k = min(n, len(rows))
+        for q in range(len(queries)):
+            top = np.argpartition(-similarity[q], k - 1)[:k]
+            for j in top[np.argsort(-similarity[q, top])]:
+                distance = float(1.0 - similarity[q, j])
+                if max_distance is not None and distance > max_distance:
+                    break
+                row = rows[j]
+                candidates[q].append(
+                    (session.ids[row], session.documents[row], session.categories[row], distance)
+                )
+
+    return [sorted(found, key=lambda hit: hit[3])[:n] for found in candidates]
+
+
+def delete(session_id: str, id: str) -> bool:
+    directory = _session_dir(session_id)
+    if id not in _get_session(session_id).ids:
+        return False
+    with _file_lock(directory):
+        _, rows_path = _paths(directory, _manifest(directory)["generation"])
+        with open(rows_path, "ab+") as handle:
+            _end_torn_line(handle)
+            handle.write(_record({"delete": id}))
+        session = _load(directory)
+        if session.deleted >= _COMPACT_MIN_DELETED and session.deleted > len(session.ids) - session.deleted:
+            _compact(directory, session)
+    return True
+
+
+def _compact(directory: Path, session: _Session) -> None:
+    """Rewrite a session without its deleted rows. Caller holds the file lock."""
+    old_generation = session.stamp[0]
+    generation = old_generation + 1
+    dim = session.matrix.shape[1]
+    vectors_path, rows_path = _paths(directory, generation)
+    keep = np.flatnonzero(session.alive)
+
+    np.asarray(session.matrix[keep], dtype=np.float32).tofile(vectors_path)
+    with open(rows_path, "wb") as handle:
+        handle.writelines(
+            _record({
+                "id": session.ids[row], "category": session.categories[row],
+                "framework_id": session.framework_ids[row], "document": session.documents[row],
+            })
+            for row in keep
+        )
+    _write_manifest(directory, generation, dim)
+
+    # Mapped readers keep the old files alive until they reload
+    for path in _paths(directory, old_generation):
+        path.unlink(missing_ok=True)
+
+
+def sessions() -> list[str]:
+    """Every session id with rows on disk."""
+    found = []
+    for directory in Path(VECTOR_INDEX_PATH).iterdir():
+        if not directory.is_dir():
+            continue
+        marker = directory / "session_id"
+        if marker.exists():
+            found.append(marker.read_text(encoding="utf-8"))
+    return found
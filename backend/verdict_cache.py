@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+
+from backend import database, metrics
+from backend.config import (
+    VERDICT_CACHE_ENABLED,
+    VERDICT_CACHE_MAX_ENTRIES,
+    VERDICT_CACHE_TTL_SECONDS,
+)
+
+# Prune expired/overflowing rows once every this many writes
+_PRUNE_EVERY = 200
+
+_lock = threading.Lock()
+_hits = 0
+_misses = 0
+_writes_since_prune = 0
+
+
+def _normalize(value: str) -> str:
+    return " ".join(value.lower().split())
+
+
+def make_key(
+    q1_text: str, q1_answer: str, q2_text: str, q2_answer: str,
+    model: str, prompt_hash: str,
+) -> str:
+    """
+    Build an order-insensitive cache key for a pair of answered statements.
+
+    The key covers the normalized texts and answers, the provider/model that
+    judged them and the prompt version, so switching models or editing the
+    prompt never serves stale verdicts.
+    """
+    pair = sorted([
+        (_normalize(q1_text), _normalize(q1_answer)),
+        (_normalize(q2_text), _normalize(q2_answer)),
+    ])
+    raw = json.dumps([pair, model, prompt_hash], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def get_many(keys: list[str]) -> dict[str, dict]:
+    global _hits, _misses
+    if not VERDICT_CACHE_ENABLED or not keys:
+        return {}
+    found = {
+        key: {**verdict, "tier": "llm"}
+        for key, verdict in database.get_cached_verdicts(
+            keys, time.time() - VERDICT_CACHE_TTL_SECONDS
+        ).items()
+    }
+    misses = len(set(keys)) - len(found)
+    with _lock:
+        _hits += len(found)
+        _misses += misses
+    metrics.count_cache("verdict", len(found), misses)
+    return found
+
+
+def get(key: str) -> dict | None:
+    return get_many([key]).get(key)
+
+
+def put(key: str, verdict: dict) -> None:
+    """Store a verdict. Only call this with real model verdicts, never fallbacks."""
+    global _writes_since_prune
+    if not VERDICT_CACHE_ENABLED:
+        return
+    now = time.time()
+    database.put_cached_verdict(key, verdict["is_consistent"], verdict["explanation"], now)
+
+    with _lock:
+        _writes_since_prune += 1
+        should_prune = _writes_since_prune >= _PRUNE_EVERY
+        if should_prune:
+            _writes_since_prune = 0
+    if should_prune:
+        database.prune_verdict_cache(now - VERDICT_CACHE_TTL_SECONDS, VERDICT_CACHE_MAX_ENTRIES)
+
+
+def stats() -> dict:
+    with _lock:
+        hits, misses = _hits, _misses
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / total if total else 0.0,
+    }
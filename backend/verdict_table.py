@@ -0,0 +1,237 @@
+"""
+Precomputed verdicts for pairs of question-bank prompts.
+
+Bank prompts are fixed and answers come from LIKERT_SCALE, so every
+bank-vs-bank comparison can be judged once, offline, per framework and prompt
+version. Each framework's table is one compressed .npz under VERDICT_TABLE_DIR:
+
+    prompts       (n,) prompt texts
+    answers       (5,) LIKERT_SCALE answers
+    explanations  (m,) deduplicated explanation strings
+    codes         (n, n, 5, 5) int32: explanation index * 2 + is_consistent,
+                  -1 where no verdict is known; symmetric in (prompt, answer)
+    meta          JSON with framework_id, prompt_hash and model
+
+Build (or fill the gaps of) the tables with an API key configured:
+
+    python -m backend.verdict_table [framework_id ...]
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+import threading
+from pathlib import Path
+
+import numpy as np
+
+from backend import metrics
+from backend.config import (
+    LIKERT_SCALE,
+    QUESTION_BANK,
+    VERDICT_TABLE_DIR,
+    VERDICT_TABLE_ENABLED,
+)
+from backend.models import QuestionResponse
+
+logger = logging.getLogger(__name__)
+
+_ANSWERS = list(LIKERT_SCALE.keys())
+
+_lock = threading.Lock()
+# Loaded tables: normalized prompt -> [(table, row)]
+_index: dict[str, list[tuple[dict, int]]] | None = None
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _path(framework_id: str) -> Path:
+    return Path(VERDICT_TABLE_DIR) / f"{framework_id}.npz"
+
+
+def _read(path: Path) -> dict:
+    with np.load(path, allow_pickle=False) as data:
+        return {
+            "meta": json.loads(str(data["meta"])),
+            "prompts": [str(p) for p in data["prompts"]],
+            "answers": [str(a) for a in data["answers"]],
+            "explanations": [str(e) for e in data["explanations"]],
+            "codes": data["codes"],
+        }
+
+
+def _get_index() -> dict[str, list[tuple[dict, int]]]:
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                index: dict[str, list[tuple[dict, int]]] = {}
+                for path in sorted(Path(VERDICT_TABLE_DIR).glob("*.npz")):
+                    try:
+                        table = _read(path)
+                    except Exception:
+                        logger.exception("Skipping unreadable verdict table %s", path)
+                        continue
+                    table["answer_index"] = {a: i for i, a in enumerate(table["answers"])}
+                    table["prompt_index"] = {
+                        _normalize(p): i for i, p in enumerate(table["prompts"])
+                    }
+                    for prompt, row in table["prompt_index"].items():
+                        index.setdefault(prompt, []).append((table, row))
+                _index = index
+    return _index
+
+
+def reload() -> None:
+    """Forget loaded tables; the next lookup reads VERDICT_TABLE_DIR again."""
+    global _index
+    with _lock:
+        _index = None
+
+
+def lookup(
+    q1_text: str, q1_answer: str, q2_text: str, q2_answer: str, prompt_hash: str
+) -> dict | None:
+    """The precomputed verdict for a pair of answered bank prompts, if any."""
+    if not VERDICT_TABLE_ENABLED:
+        return None
+    index = _get_index()
+    if not index:
+        return None
+    verdict = _lookup(index, q1_text, q1_answer, q2_text, q2_answer, prompt_hash)
+    metrics.count_cache("verdict_table", int(verdict is not None), int(verdict is None))
+    return verdict
+
+
+def _lookup(
+    index: dict[str, list[tuple[dict, int]]],
+    q1_text: str, q1_answer: str, q2_text: str, q2_answer: str, prompt_hash: str,
+) -> dict | None:
+    first = index.get(_normalize(q1_text))
+    if not first:
+        return None
+    other = _normalize(q2_text)
+    for table, i in first:
+        if table["meta"]["prompt_hash"] != prompt_hash:
+            continue
+        j = table["prompt_index"].get(other)
+        a = table["answer_index"].get(q1_answer)
+        b = table["answer_index"].get(q2_answer)
+        if j is None or a is None or b is None:
+            continue
+        code = int(table["codes"][i, j, a, b])
+        if code < 0:
+            continue
+        return {
+            "is_consistent": bool(code & 1),
+            "explanation": table["explanations"][code >> 1],
+            "tier": "table",
+        }
+    return None
+
+
+def build(framework_id: str, check_groups, prompt_hash: str, model: str) -> dict:
+    """
+    Judge every pair of the framework's bank prompts under every answer pair.
+
+    check_groups is consistency.check_consistency_groups, called without the
+    local pre-filter so every cell holds a model verdict. Pairs it cannot
+    judge (provider errors, deadline) stay -1, and running the build again
+    only sends those to the LLM because known pairs are read from the
+    existing table. Returns counts of known and missing pairs.
+    """
+    prompts = QUESTION_BANK[framework_id]
+    n, k = len(prompts), len(_ANSWERS)
+
+    def neighbor_id(j: int, b: int) -> str:
+        return f"{j}:{b}"
+
+    groups, owners, known = [], [], []
+    for i in range(n):
+        for a in range(k):
+            neighbors, existing = [], {}
+            for j in range(i + 1, n):
+                for b in range(k):
+                    verdict = lookup(prompts[i], _ANSWERS[a], prompts[j], _ANSWERS[b], prompt_hash)
+                    if verdict is not None:
+                        existing[neighbor_id(j, b)] = verdict
+                    else:
+                        neighbors.append(QuestionResponse(
+                            id=neighbor_id(j, b), text=prompts[j], answer=_ANSWERS[b],
+                            category="", created_at="",
+                        ))
+            if neighbors or existing:
+                groups.append((prompts[i], _ANSWERS[a], neighbors))
+                owners.append((i, a))
+                known.append(existing)
+
+    results = check_groups(groups, deadline=3600.0, use_prefilter=False)
+    for verdicts, existing in zip(results, known):
+        verdicts.update(existing)
+
+    codes = np.full((n, n, k, k), -1, dtype=np.int32)
+    explanations: dict[str, int] = {}
+    for (i, a), verdicts in zip(owners, results):
+        for key, verdict in verdicts.items():
+            # Only real model verdicts; never fallbacks or local heuristics
+            if verdict.get("tier") not in ("llm", "table"):
+                continue
+            j, b = (int(part) for part in key.split(":"))
+            index = explanations.setdefault(verdict["explanation"], len(explanations))
+            code = index * 2 + int(bool(verdict["is_consistent"]))
+            codes[i, j, a, b] = code
+            codes[j, i, b, a] = code
+
+    Path(VERDICT_TABLE_DIR).mkdir(parents=True, exist_ok=True)
+    path = _path(framework_id)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(
+            f,
+            prompts=np.array(prompts),
+            answers=np.array(_ANSWERS),
+            explanations=np.array(list(explanations) or [""]),
+            codes=codes,
+            meta=np.array(json.dumps({
+                "framework_id": framework_id, "prompt_hash": prompt_hash, "model": model,
+            })),
+        )
+    os.replace(tmp_path, path)
+    reload()
+
+    total = n * (n - 1) // 2 * k * k
+    missing = int((codes < 0).sum() - n * k * k) // 2
+    return {"framework_id": framework_id, "pairs": total, "known": total - missing, "missing": missing}
+
+
+def main(argv: list[str]) -> int:
+    from backend import consistency, database, llm_scheduler
+
+    model = consistency.active_model()
+    if model is None:
+        print("No API key configured; set GEMINI_API_KEY or ANTHROPIC_API_KEY")
+        return 1
+    # The verdict cache and the shared rate limits live in the main database
+    database.init_db()
+    framework_ids = argv or list(QUESTION_BANK.keys())
+    incomplete = False
+    for framework_id in framework_ids:
+        # Offline builds yield to interactive checks from running servers
+        with llm_scheduler.priority(llm_scheduler.BACKGROUND):
+            report = build(
+                framework_id, consistency.check_consistency_groups, consistency.PROMPT_HASH, model
+            )
+        print(
+            f"{framework_id}: {report['known']}/{report['pairs']} pairs "
+            f"({report['missing']} missing) -> {_path(framework_id)}"
+        )
+        incomplete = incomplete or report["missing"] > 0
+    return 1 if incomplete else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
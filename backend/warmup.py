@@ -0,0 +1,82 @@
+"""
+Background warm-up of the slow-to-load pieces, and the readiness state behind /readyz.
+
+Loading the embedding model, the prototype centroids, the question bank
+embeddings and the vector index can take several seconds. Startup only
+initializes the database and then runs the rest here, so the process answers
+/healthz immediately and /readyz once every step has finished.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+
+from backend import categorizer, embeddings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_thread: threading.Thread | None = None
+_steps: dict[str, str] = {}
+_error: str | None = None
+_started_at: float | None = None
+_finished_at: float | None = None
+
+# Run in order; each name is reported by status()
+STEPS = [
+    ("model", embeddings.warm_up),
+    ("prototypes", categorizer.warm_prototypes),
+    ("question_bank", categorizer.warm_question_bank),
+    ("session_metadata", embeddings.backfill_session_metadata),
+]
+
+
+def _run() -> None:
+    global _error, _finished_at
+    for name, step in STEPS:
+        with _lock:
+            _steps[name] = "loading"
+        try:
+            step()
+        except Exception as e:
+            logger.exception("Warm-up step %s failed", name)
+            with _lock:
+                _steps[name] = "failed"
+                _error = f"{name}: {e}"
+            return
+        with _lock:
+            _steps[name] = "ready"
+    with _lock:
+        _finished_at = time.time()
+    logger.info("Warm-up finished in %.1fs", _finished_at - _started_at)
+
+
+def start() -> None:
+    """Start warming up in a daemon thread; later calls are no-ops."""
+    global _thread, _started_at
+    with _lock:
+        if _thread is not None:
+            return
+        _steps.update({name: "pending" for name, _ in STEPS})
+        _started_at = time.time()
+        _thread = threading.Thread(target=_run, name="warm-up", daemon=True)
+    _thread.start()
+
+
+def is_ready() -> bool:
+    with _lock:
+        return _finished_at is not None
+
+
+def status() -> dict:
+    with _lock:
+        return {
+            "ready": _finished_at is not None,
+            "steps": dict(_steps),
+            "error": _error,
+            "seconds": (
+                (_finished_at or time.time()) - _started_at
+                if _started_at is not None else None
+            ),
+        }
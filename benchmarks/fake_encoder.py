@@ -0,0 +1,39 @@
+"""
+Deterministic stand-in for the MiniLM SentenceTransformer.
+
+Each token gets a fixed pseudo-random direction (seeded by its hash) and a
+text embeds to the normalized sum of its tokens, so statements that share
+words stay close, like real embeddings, without loading a model.
+"""
+from __future__ import annotations
+
+import re
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z']+")
+
+
+class FakeEncoder:
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    @lru_cache(maxsize=65536)
+    def _token_vector(self, token: str) -> np.ndarray:
+        rng = np.random.default_rng(zlib.crc32(token.encode("utf-8")))
+        return rng.standard_normal(self.dim).astype(np.float32)
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in _TOKEN.findall(text.lower()) or [text]:
+            vector += self._token_vector(token)
+        return vector / (np.linalg.norm(vector) or 1.0)
+
+    def encode(self, sentences, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            return self._encode_one(sentences)
+        if not sentences:
+            return np.empty((0, self.dim), dtype=np.float32)
+        return np.vstack([self._encode_one(text) for text in sentences])
@@ -0,0 +1,302 @@
+"""
+Load-test the API against a stub LLM and report latency, throughput and memory.
+
+Starts the stub LLM server in-process and the backend in a subprocess with a
+scratch DATA_DIR, then drives each session through POST /api/questions,
+GET /api/graph, GET /api/questions and DELETE /api/questions/{id}:
+
+    python -m benchmarks.run --sessions 8 --statements 40 --concurrency 8 \\
+        --latency-ms 300 --error-rate 0.02 --fake-encoder
+
+Results are written as JSON (benchmarks/results/<timestamp>.json by default).
+Pass --baseline with an earlier result to print a comparison; with
+--max-regression the exit code is 1 when any p95 or the overall throughput is
+worse than the baseline by more than that fraction.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import requests
+
+from benchmarks.stub_llm import StubLLM
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+_SUBJECTS = [
+    "my career", "my health", "my relationships", "my mistakes", "my time",
+    "my money", "my team", "my family", "my habits", "my goals", "the future",
+    "criticism", "failure", "risk", "rules", "luck",
+]
+_CLAIMS = [
+    "I am in control of {}", "I take full responsibility for {}",
+    "I rarely think about {}", "Other people decide {}", "I plan carefully for {}",
+    "I avoid conflict about {}", "I am honest with myself about {}",
+    "Circumstances shape {} more than I do", "I keep promises about {}",
+    "I change my mind easily about {}",
+]
+_ANSWERS = ["Strongly Disagree", "Disagree", "Neutral", "Agree", "Strongly Agree"]
+
+
+def _statements(rng: random.Random, count: int) -> list[tuple[str, str]]:
+    return [
+        (rng.choice(_CLAIMS).format(rng.choice(_SUBJECTS)) + f" ({i})", rng.choice(_ANSWERS))
+        for i in range(count)
+    ]
+
+
+class Recorder:
+    """Latencies and errors per endpoint, shared by all workers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def call(self, endpoint: str, method: str, url: str, **kwargs) -> requests.Response | None:
+        start = time.perf_counter()
+        try:
+            response = requests.request(method, url, timeout=120, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        elapsed = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.latencies[endpoint].append(elapsed)
+            if not ok:
+                self.errors[endpoint] += 1
+        return response if ok else None
+
+
+def _run_session(
+    base_url: str,
+    session_id: str,
+    statements: list[tuple[str, str]],
+    delete_fraction: float,
+    wait_jobs: bool,
+    recorder: Recorder,
+    rng: random.Random,
+) -> None:
+    headers = {"X-Session-ID": session_id}
+    created, job_ids = [], []
+    for text, answer in statements:
+        response = recorder.call(
+            "POST /api/questions", "POST", f"{base_url}/api/questions",
+            json={"text": text, "answer": answer, "session_id": session_id}, headers=headers,
+        )
+        if response is not None:
+            body = response.json()
+            created.append(body["question"]["id"])
+            if body.get("job_id"):
+                job_ids.append(body["job_id"])
+        recorder.call("GET /api/graph", "GET", f"{base_url}/api/graph", headers=headers)
+
+    if wait_jobs:
+        for job_id in job_ids:
+            while True:
+                response = requests.get(f"{base_url}/api/jobs/{job_id}", timeout=30)
+                if response.status_code != 200 or response.json()["status"] in ("done", "failed"):
+                    break
+                time.sleep(0.1)
+
+    recorder.call("GET /api/questions", "GET", f"{base_url}/api/questions", headers=headers)
+    recorder.call("GET /api/graph", "GET", f"{base_url}/api/graph", headers=headers)
+    for question_id in rng.sample(created, int(len(created) * delete_fraction)):
+        recorder.call(
+            "DELETE /api/questions/{id}", "DELETE", f"{base_url}/api/questions/{question_id}"
+        )
+
+
+def _peak_rss_mb(pid: int) -> float | None:
+    """High-water resident set size of a process, from /proc (Linux only)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _summarize(recorder: Recorder, elapsed: float) -> dict:
+    endpoints = {}
+    for endpoint, samples in sorted(recorder.latencies.items()):
+        values = np.array(samples)
+        endpoints[endpoint] = {
+            "count": len(samples),
+            "errors": recorder.errors.get(endpoint, 0),
+            "p50_ms": round(float(np.percentile(values, 50)), 2),
+            "p95_ms": round(float(np.percentile(values, 95)), 2),
+            "p99_ms": round(float(np.percentile(values, 99)), 2),
+            "mean_ms": round(float(values.mean()), 2),
+            "rps": round(len(samples) / elapsed, 2),
+        }
+    total = sum(e["count"] for e in endpoints.values())
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": total,
+        "errors": sum(e["errors"] for e in endpoints.values()),
+        "rps": round(total / elapsed, 2) if elapsed else 0.0,
+        "endpoints": endpoints,
+    }
+
+
+def _wait_ready(base_url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if requests.get(f"{base_url}/readyz", timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server not ready after {timeout:.0f}s")
+
+
+def compare(result: dict, baseline: dict, max_regression: float | None) -> bool:
+    """Print p95 and throughput against a baseline; False if beyond max_regression."""
+    ok = True
+
+    def line(label: str, now: float, then: float, higher_is_worse: bool) -> None:
+        nonlocal ok
+        change = (now - then) / then if then else 0.0
+        worse = change if higher_is_worse else -change
+        flag = ""
+        if max_regression is not None and worse > max_regression:
+            ok, flag = False, "  REGRESSION"
+        print(f"  {label:<40} {then:>10.2f} -> {now:>10.2f}  ({change:+.1%}){flag}")
+
+    print("Compared to baseline:")
+    for endpoint, stats in result["endpoints"].items():
+        before = baseline["endpoints"].get(endpoint)
+        if before:
+            line(f"{endpoint} p95 ms", stats["p95_ms"], before["p95_ms"], True)
+    line("throughput rps", result["rps"], baseline["rps"], False)
+    return ok
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--statements", type=int, default=25, help="statements per session")
+    parser.add_argument("--concurrency", type=int, default=4, help="sessions driven at once")
+    parser.add_argument("--delete-fraction", type=float, default=0.2)
+    parser.add_argument("--wait-jobs", action="store_true",
+                        help="wait for each session's consistency jobs before reading it back")
+    parser.add_argument("--latency-ms", type=float, default=300.0, help="stub LLM latency")
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="stub LLM 503 rate")
+    parser.add_argument("--provider", choices=["gemini", "anthropic"], default="gemini")
+    parser.add_argument("--fake-encoder", action="store_true",
+                        help="use the deterministic hash encoder instead of MiniLM")
+    parser.add_argument("--vector-index", choices=["chroma", "numpy"], default=None)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="allowed fractional regression against --baseline, e.g. 0.1")
+    args = parser.parse_args(argv)
+
+    stub = StubLLM(args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    stub_url = stub.start()
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    with tempfile.TemporaryDirectory(prefix="mirror-bench-") as data_dir:
+        env = {
+            k: v for k, v in os.environ.items()
+            if k not in ("GEMINI_API_KEY", "ANTHROPIC_API_KEY")
+        }
+        env["DATA_DIR"] = data_dir
+        if args.provider == "gemini":
+            env.update(GEMINI_API_KEY="stub", GEMINI_API_BASE=stub_url)
+        else:
+            env.update(ANTHROPIC_API_KEY="stub", ANTHROPIC_BASE_URL=stub_url)
+        if args.vector_index:
+            env["VECTOR_INDEX_BACKEND"] = args.vector_index
+
+        command = [sys.executable, "-m", "benchmarks.serve", "--port", str(args.port)]
+        if args.fake_encoder:
+            command.append("--fake-encoder")
+        process = subprocess.Popen(command, env=env, cwd=Path(__file__).parent.parent)
+        try:
+            started = time.perf_counter()
+            _wait_ready(base_url, process, args.ready_timeout)
+            ready_s = time.perf_counter() - started
+
+            rng = random.Random(args.seed)
+            workloads = [
+                (f"bench-{i}", _statements(rng, args.statements), random.Random(rng.random()))
+                for i in range(args.sessions)
+            ]
+            recorder = Recorder()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                futures = [
+                    pool.submit(
+                        _run_session, base_url, session_id, statements,
+                        args.delete_fraction, args.wait_jobs, recorder, session_rng,
+                    )
+                    for session_id, statements, session_rng in workloads
+                ]
+                for future in futures:
+                    future.result()
+            elapsed = time.perf_counter() - started
+            peak_rss_mb = _peak_rss_mb(process.pid)
+        finally:
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+            stub.stop()
+
+    result = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            key: (str(value) if isinstance(value, Path) else value)
+            for key, value in vars(args).items()
+        },
+        "ready_s": round(ready_s, 3),
+        "peak_rss_mb": round(peak_rss_mb, 1) if peak_rss_mb is not None else None,
+        "stub_llm": stub.stats(),
+        **_summarize(recorder, elapsed),
+    }
+
+    output = args.output or RESULTS_DIR / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2) + "\n")
+
+    print(f"{result['requests']} requests in {result['elapsed_s']}s "
+          f"({result['rps']} rps, {result['errors']} errors), peak RSS {result['peak_rss_mb']} MB")
+    for endpoint, stats in result["endpoints"].items():
+        print(f"  {endpoint:<30} p50 {stats['p50_ms']:>8.1f}  p95 {stats['p95_ms']:>8.1f}  "
+              f"p99 {stats['p99_ms']:>8.1f} ms  ({stats['count']} calls, {stats['errors']} errors)")
+    print(f"Wrote {output}")
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        if not compare(result, baseline, args.max_regression):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+"""
+Run the backend for benchmarking, optionally with the fake encoder.
+
+    python -m benchmarks.serve --port 8000 [--fake-encoder]
+
+Point DATA_DIR at a scratch directory and GEMINI_API_BASE (or
+ANTHROPIC_BASE_URL) at the stub LLM server; benchmarks.run does both.
+"""
+from __future__ import annotations
+
+import argparse
+
+import uvicorn
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fake-encoder", action="store_true")
+    args = parser.parse_args()
+
+    if args.fake_encoder:
+        from backend import embeddings
+        from benchmarks.fake_encoder import FakeEncoder
+
+        embeddings.set_model(FakeEncoder(), "fake-hash-encoder")
+
+    from backend.main import app
+
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Local stand-in for the Gemini and Anthropic HTTP APIs.
+
+Answers generateContent (Gemini) and /v1/messages (Anthropic) requests with
+deterministic verdicts after a configurable latency, and fails a configurable
+fraction of requests with 503. Batch prompts ("[1] ...", "[2] ...") get a
+JSON array with one verdict per numbered statement, single-pair prompts a
+JSON object.
+
+    python -m benchmarks.stub_llm --port 8787 --latency-ms 300 --error-rate 0.02
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_NUMBERED = re.compile(r"^\[(\d+)\] (.*)$", re.MULTILINE)
+_NEW_STATEMENT = re.compile(r"^New statement: (.*)$", re.MULTILINE)
+
+
+def _verdict(*parts: str) -> dict:
+    digest = hashlib.sha256("\0".join(parts).encode("utf-8")).digest()
+    # Roughly one pair in four is a contradiction
+    is_consistent = digest[0] % 4 != 0
+    return {
+        "is_consistent": is_consistent,
+        "explanation": "Stub verdict: consistent." if is_consistent else "Stub verdict: contradiction.",
+    }
+
+
+def respond(prompt: str) -> str:
+    numbered = _NUMBERED.findall(prompt)
+    if numbered:
+        new = _NEW_STATEMENT.search(prompt)
+        statement = new.group(1) if new else ""
+        return json.dumps([
+            {"index": int(index), **_verdict(statement, text)}
+            for index, text in numbered
+        ])
+    return json.dumps(_verdict(prompt))
+
+
+class StubLLM:
+    def __init__(
+        self,
+        latency_ms: float = 300.0,
+        jitter_ms: float = 100.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.server: ThreadingHTTPServer | None = None
+
+    def _delay_and_fail(self) -> bool:
+        """Sleep for one simulated request; True if it should fail."""
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self._random.gauss(self.latency_ms, self.jitter_ms)) / 1000
+            failed = self._random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(delay)
+        return failed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "errors": self.errors}
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def _send(self, status: int, body: dict) -> None:
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self) -> None:
+                if self.path == "/stats":
+                    self._send(200, stub.stats())
+                else:
+                    self._send(404, {"error": "not found"})
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if ":generateContent" in self.path:
+                    prompt = body["contents"][0]["parts"][0]["text"]
+                elif self.path.startswith("/v1/messages"):
+                    prompt = body["messages"][0]["content"]
+                else:
+                    self._send(404, {"error": "not found"})
+                    return
+
+                if stub._delay_and_fail():
+                    self._send(503, {"error": {"message": "stub overloaded", "type": "overloaded_error"}})
+                    return
+
+                text = respond(prompt)
+                if ":generateContent" in self.path:
+                    self._send(200, {"candidates": [{"content": {"parts": [{"text": text}]}}]})
+                else:
+                    self._send(200, {
+                        "id": "msg_stub",
+                        "type": "message",
+                        "role": "assistant",
+                        "model": body.get("model", "stub"),
+                        "content": [{"type": "text", "text": text}],
+                        "stop_reason": "end_turn",
+                        "stop_sequence": None,
+                        "usage": {"input_tokens": len(prompt) // 4, "output_tokens": len(text) // 4},
+                    })
+
+        return Handler
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Serve in a daemon thread; returns the base URL."""
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="stub-llm", daemon=True).start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=100.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    stub = StubLLM(args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    print(f"Stub LLM listening on {stub.start(args.host, args.port)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -28,7 +28,7 @@ export default function AddQuestionPanel({
       onConsistencyResults(result.consistency);
 
       const hasInconsistency = result.consistency.some(
-        (r) => !r.is_consistent
+        (r) => r.is_consistent === false
       );
       setFlash(hasInconsistency ? "red" : "green");
       setTimeout(() => setFlash(null), 1500);
@@ -24,19 +24,27 @@ export default function AlertsPanel({ results }: AlertsPanelProps) {
         <div
           key={`${result.source_id}-${result.target_id}-${idx}`}
           className={`rounded-md border p-3 text-sm ${
-            result.is_consistent
+            result.is_consistent === null
+              ? "border-l-4 border-l-gray-400 border-gray-200 bg-gray-50"
+              : result.is_consistent
               ? "border-l-4 border-l-green-500 border-gray-200 bg-green-50"
               : "border-l-4 border-l-red-500 border-gray-200 bg-red-50"
           }`}
         >
           <span
             className={`inline-block text-xs font-semibold px-1.5 py-0.5 rounded ${
-              result.is_consistent
+              result.is_consistent === null
+                ? "bg-gray-200 text-gray-700"
+                : result.is_consistent
                 ? "bg-green-200 text-green-800"
                 : "bg-red-200 text-red-800"
             }`}
           >
-            {result.is_consistent ? "Consistent" : "Inconsistent"}
+            {result.is_consistent === null
+              ? "Unknown"
+              : result.is_consistent
+              ? "Consistent"
+              : "Inconsistent"}
           </span>
           <p className="mt-1 text-gray-600 text-xs leading-relaxed">
             {result.explanation}
@@ -95,7 +95,7 @@ export default function QuizMode({
       setSaving(true);
       try {
         const result = await addQuestion(prompts[index], answer, frameworkId);
-        const inconsistencies = result.consistency.filter((r) => !r.is_consistent);
+        const inconsistencies = result.consistency.filter((r) => r.is_consistent === false);
         const hasInconsistency = inconsistencies.length > 0;
         onConsistencyResults(result.consistency);
         onSave();
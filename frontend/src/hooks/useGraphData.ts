@@ -1,11 +1,42 @@
+import { useRef } from "react";
 import useSWR from "swr";
 import { getGraph } from "@/lib/api";
-import type { GraphData } from "@/lib/types";
+import type { GraphData, GraphDelta } from "@/lib/types";
+
+function applyDelta(current: GraphData, delta: GraphDelta): GraphData {
+  const removedNodes = new Set(delta.removed_nodes);
+  const removedEdges = new Set(delta.removed_edges);
+  const nodes = new Map(
+    current.nodes.filter((n) => !removedNodes.has(n.id)).map((n) => [n.id, n])
+  );
+  for (const node of delta.nodes) nodes.set(node.id, node);
+  const edges = new Map(
+    current.edges.filter((e) => !removedEdges.has(e.id)).map((e) => [e.id, e])
+  );
+  for (const edge of delta.edges) edges.set(edge.id, edge);
+  return {
+    nodes: Array.from(nodes.values()),
+    edges: Array.from(edges.values()),
+    version: delta.version,
+  };
+}
 
 export function useGraphData() {
+  const latest = useRef<GraphData | undefined>(undefined);
+
+  // After the first load only changes since the last seen version are fetched
+  const fetchGraph = async () => {
+    const current = latest.current;
+    const update = await getGraph(current?.version);
+    const next =
+      current && "since" in update ? applyDelta(current, update) : (update as GraphData);
+    latest.current = next;
+    return next;
+  };
+
   const { data, error, isLoading, mutate } = useSWR<GraphData>(
     "/api/graph",
-    getGraph,
+    fetchGraph,
     { refreshInterval: 0 }
   );
 
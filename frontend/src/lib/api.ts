@@ -3,6 +3,8 @@ import type {
   CheckRequest,
   CheckResponse,
   GraphData,
+  GraphDelta,
+  JobStatus,
   Question,
 } from "./types";
 import { getSessionId } from "./session";
@@ -32,15 +34,38 @@ export async function getPrompts(frameworkId: string): Promise<string[]> {
   return data.prompts;
 }
 
+const JOB_POLL_MS = 500;
+// Stop waiting for background checks after this long and show what is done
+const JOB_POLL_TIMEOUT_MS = 120_000;
+
+export async function getJob(jobId: string): Promise<JobStatus> {
+  return request<JobStatus>(`/api/jobs/${jobId}`);
+}
+
 export async function addQuestion(
   text: string,
   answer: string,
   frameworkId?: string
 ): Promise<AddQuestionResponse> {
-  return request<AddQuestionResponse>("/api/questions", {
+  const created = await request<AddQuestionResponse>("/api/questions", {
     method: "POST",
     body: JSON.stringify({ text, answer, framework_id: frameworkId }),
   });
+  if (!created.job_id) return created;
+
+  // Pairs settled locally come back at once; the rest run in the background
+  const deadline = Date.now() + JOB_POLL_TIMEOUT_MS;
+  let job: JobStatus | undefined;
+  try {
+    job = await getJob(created.job_id);
+    while (job.status !== "done" && Date.now() < deadline) {
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_MS));
+      job = await getJob(created.job_id);
+    }
+  } catch {
+    // The question is saved either way; a vanished job just adds no results
+  }
+  return { ...created, consistency: [...created.consistency, ...(job?.results ?? [])] };
 }
 
 export async function getQuestions(): Promise<Question[]> {
@@ -51,8 +76,9 @@ export async function deleteQuestion(id: string): Promise<void> {
   await request<void>(`/api/questions/${id}`, { method: "DELETE" });
 }
 
-export async function getGraph(): Promise<GraphData> {
-  return request<GraphData>("/api/graph");
+export async function getGraph(since?: number): Promise<GraphData | GraphDelta> {
+  const query = since === undefined ? "" : `?since=${since}`;
+  return request<GraphData | GraphDelta>(`/api/graph${query}`);
 }
 
 export async function checkConsistency(
@@ -4,21 +4,35 @@ export interface Question {
   answer: string;
   category: string;
   created_at: string;
+  framework_id?: string;
 }
 
 export interface ConsistencyResult {
   source_id: string;
   target_id: string;
-  is_consistent: boolean;
+  /** null when the pair could not be checked (provider error or deadline) */
+  is_consistent: boolean | null;
   explanation: string;
   color: string;
   target_text?: string;
   target_answer?: string;
+  tier?: string;
 }
 
 export interface AddQuestionResponse {
   question: Question;
   consistency: ConsistencyResult[];
+  job_id?: string | null;
+}
+
+export interface JobStatus {
+  id: string;
+  question_id: string;
+  status: "pending" | "running" | "done";
+  total: number;
+  completed: number;
+  failed: number;
+  results: ConsistencyResult[];
 }
 
 export interface GraphNodeData {
@@ -55,6 +69,16 @@ export interface GraphEdge {
 export interface GraphData {
   nodes: GraphNode[];
   edges: GraphEdge[];
+  version: number;
+}
+
+export interface GraphDelta {
+  version: number;
+  since: number;
+  nodes: GraphNode[];
+  edges: GraphEdge[];
+  removed_nodes: string[];
+  removed_edges: string[];
 }
 
 export interface CheckRequest {
@@ -65,7 +89,7 @@ export interface CheckRequest {
 }
 
 export interface CheckResponse {
-  is_consistent: boolean;
+  is_consistent: boolean | null;
   explanation: string;
 }
 